@@ -0,0 +1,197 @@
+"""
+Banded and tridiagonal solvers.
+O(n*bandwidth) factor and solve, for splines and network systems.
+Reference: NR3 C++ (tridag, cyclic, banmul, Bandec)
+"""
+
+import numpy as np
+from scipy.linalg import solve_banded, LinAlgError
+from scipy.linalg.lapack import dgbtrf, dgbtrs
+
+__all__ = ['tridag', 'tridag_batch', 'cyclic', 'banmul', 'Bandec']
+
+
+def tridag(a, b, c, r):
+
+  """Solve the tridiagonal system
+     a[i]*x[i-1] + b[i]*x[i] + c[i]*x[i+1] = r[i]
+     a[0] and c[n-1] are not used. r may be a block (n x m), one right
+     hand side per column. LAPACK (gtsv) with partial pivoting.
+  """
+
+  b = np.asarray(b, dtype=float)
+  n = len(b)
+  ab = np.zeros((3, n))
+  ab[0, 1:] = np.asarray(c, dtype=float)[:n-1]
+  ab[1] = b
+  ab[2, :-1] = np.asarray(a, dtype=float)[1:]
+  try:
+    return solve_banded((1, 1), ab, np.asarray(r, dtype=float),
+      check_finite=False)
+  except LinAlgError:
+    raise ValueError('Singular matrix in tridag!')
+
+
+def tridag_batch(a, b, c, r):
+
+  """Solve many independent tridiagonal systems at once.
+     a, b, c and r are (..., n) arrays (broadcast), one system per
+     row along the last axis. Thomas algorithm, each step is done
+     for all the systems together. Returns x with the shape of r.
+  """
+
+  a, b, c, r = np.broadcast_arrays(*[np.asarray(v, dtype=float)
+    for v in (a, b, c, r)])
+  shape = r.shape
+  n = shape[-1]
+  # system index last, so that each step is a contiguous row
+  a, b, c, r = [np.ascontiguousarray(np.moveaxis(v, -1, 0)).reshape(n, -1)
+    for v in (a, b, c, r)]
+  u = np.empty_like(r)
+  gam = np.empty_like(r)
+  bet = b[0].copy()
+  if np.any(bet == 0.0):
+    raise ValueError('Error 1 in tridag!')
+  u[0] = r[0] / bet
+  for j in range(1, n):
+    gam[j] = c[j-1] / bet
+    bet = b[j] - a[j]*gam[j]
+    if np.any(bet == 0.0):
+      raise ValueError('Error 2 in tridag!')
+    u[j] = (r[j] - a[j]*u[j-1]) / bet
+  for j in range(n-2, -1, -1):
+    u[j] -= gam[j+1]*u[j+1]
+  return np.moveaxis(u.reshape((n,) + shape[:-1]), 0, -1)
+
+
+def cyclic(a, b, c, alpha, beta, r):
+
+  """Solve the cyclic tridiagonal system, as tridag with the corner
+     values alpha = A[n-1][0] and beta = A[0][n-1] (periodic splines).
+     Sherman-Morrison on one tridag call with an extra right hand side.
+  """
+
+  b = np.array(b, dtype=float)
+  r = np.asarray(r, dtype=float)
+  n = len(b)
+  if n <= 2:
+    raise ValueError('n too small in cyclic!')
+  gamma = -b[0]
+  b[0] -= gamma
+  b[n-1] -= alpha*beta/gamma
+  u = np.zeros(n)
+  u[0] = gamma
+  u[n-1] = alpha
+  s = tridag(a, b, c, np.column_stack([r.reshape(n, -1), u]))
+  x, z = s[:, :-1], s[:, -1]
+  fact = (x[0] + beta*x[n-1]/gamma) / (1.0 + z[0] + beta*z[n-1]/gamma)
+  x -= np.outer(z, fact)
+  return x.reshape(r.shape)
+
+
+def banmul(a, m1, m2, x):
+
+  """Product of a band matrix and x.
+     a is in the compact storage of NR, a[i][j-i+m1] = A[i][j],
+     n x (m1+m2+1), for m1 subdiagonals and m2 superdiagonals.
+  """
+
+  a = np.asarray(a, dtype=float)
+  x = np.asarray(x, dtype=float)
+  n = len(a)
+  y = np.zeros(x.shape)
+  for k in range(m1+m2+1):
+    lo, hi = max(0, m1-k), min(n, n+m1-k)
+    y[lo:hi] += (a[lo:hi, k] * x[lo+k-m1:hi+k-m1].T).T
+  return y
+
+
+class Bandec(object):
+
+  """LU decomposition of a band matrix (NR3 Bandec).
+     a is in the compact storage of banmul. The factor is LAPACK gbtrf
+     (partial pivoting), then solve(b) for a vector or a block of
+     right hand sides costs O(n*m1*(m1+m2)) each.
+  """
+
+  def __init__(self, a, m1, m2):
+    a = np.asarray(a, dtype=float)
+    n = len(a)
+    if a.shape != (n, m1+m2+1):
+      raise ValueError('Bandec bad sizes!')
+    self.n, self.m1, self.m2 = n, m1, m2
+    # LAPACK band storage, A[i][j] at ab[2*m1+m2-k][j] for j=i+k-m1
+    ab = np.zeros((2*m1+m2+1, n))
+    i = np.arange(n)
+    for k in range(m1+m2+1):
+      j = i + k - m1
+      ok = (j >= 0) & (j < n)
+      ab[2*m1+m2-k, j[ok]] = a[i[ok], k]
+    self.lu, self.piv, info = dgbtrf(ab, m1, m2)
+    if info > 0:
+      raise ValueError('Singular matrix in Bandec!')
+
+  def solve(self, b):
+    'x for a vector b, or X for a block b (n x m)'
+    b = np.asarray(b, dtype=float)
+    x, info = dgbtrs(self.lu, self.m1, self.m2, b.reshape(self.n, -1), self.piv)
+    return x.reshape(b.shape)
+
+  def det(self):
+    'determinant'
+    swaps = np.count_nonzero(self.piv != np.arange(self.n))
+    d = float(np.prod(self.lu[self.m1+self.m2]))
+    return -d if swaps % 2 else d
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  from time import perf_counter
+
+  # tridiagonal check against a dense solve
+  n = 8
+  a, b, c = np.random.uniform(-1, 1, (3, n))
+  b += 4.0
+  r = np.random.uniform(-1, 1, n)
+  A = np.diag(b) + np.diag(a[1:], -1) + np.diag(c[:-1], 1)
+  print(f'tridag err {np.max(np.abs(tridag(a, b, c, r) - np.linalg.solve(A, r))):0.2g}')
+
+  # periodic system
+  A[n-1, 0], A[0, n-1] = 0.5, -0.25
+  x = cyclic(a, b, c, 0.5, -0.25, r)
+  print(f'cyclic err {np.max(np.abs(A @ x - r)):0.2g}')
+
+  # band matrix, 2 below and 3 above the diagonal
+  n, m1, m2 = 2000, 2, 3
+  ab = np.random.uniform(-1, 1, (n, m1+m2+1))
+  ab[:, m1] += 8.0
+  A = np.zeros((n, n))
+  for i in range(n):
+    for k in range(m1+m2+1):
+      if 0 <= i+k-m1 < n:
+        A[i, i+k-m1] = ab[i, k]
+  r = np.random.uniform(-1, 1, (n, 3))
+  t = perf_counter()
+  bd = Bandec(ab, m1, m2)
+  x = bd.solve(r)
+  t = perf_counter() - t
+  td = perf_counter()
+  xd = np.linalg.solve(A, r)
+  td = perf_counter() - td
+  print(f'Bandec n={n}: {t:0.4f}s, dense {td:0.4f}s, err {np.max(np.abs(x - xd)):0.2g}, '
+    f'residual {np.max(np.abs(banmul(ab, m1, m2, x) - r)):0.2g}')
+  print(f'det {Bandec(ab[:20], m1, m2).det():0.6g} vs {np.linalg.det(A[:20, :20]):0.6g}')
+
+  # many small systems in one call
+  m, n = 10000, 32
+  a, b, c, r = np.random.uniform(-1, 1, (4, m, n))
+  b += 4.0
+  t = perf_counter()
+  x = tridag_batch(a, b, c, r)
+  t = perf_counter() - t
+  tl = perf_counter()
+  xl = np.array([tridag(*v) for v in zip(a, b, c, r)])
+  tl = perf_counter() - tl
+  print(f'{m} systems of {n}: batch {t:0.3f}s, loop {tl:0.3f}s, max diff {np.max(np.abs(x - xl)):0.2g}')
@@ -7,7 +7,8 @@ Bruce Wernick
 import numpy as np
 from scipy.optimize import leastsq
 from scipy.stats import linregress
-from scipy import interpolate, array
+from scipy import interpolate
+from svd import wlsqfit
 
 __all__ = ['poly2D', 'polyARI', 'do_stats', 'get_outlier', 
   'fit2D', 'fitARI', 'prep', 'CurveFit', 
@@ -86,12 +87,25 @@ def prep(xRange, yRange, zData, factor):
         z.append(factor*zData[j][i])
   return np.array(x), np.array(y), np.array(z)
 
-def CurveFit(xList, yList, zList, a=None, factor=1.0, kind='ari'):
+def CurveFit(xList, yList, zList, a=None, factor=1.0, kind='ari',
+  weights=None, robust=None, full=False):
   """xList and yList are lists of the independent variables.
   zList is a 2-d list of the dependent variable. The dimensions
   of z must be the same as the len(xList) x len(yList).
+  weights (2-d, same shape as zList) and robust ('huber' or 'tukey')
+  give a weighted or robust linear fit by svd.wlsqfit, in one call
+  instead of removing outliers and refitting. full=True also returns
+  the residuals and weights of the fitted points.
   """
   x,y,z = prep(xList, yList, zList, factor)
+  if weights is not None or robust is not None or full:
+    if kind not in ('ari', '2d'):
+      raise ValueError(f'unknown kind {kind}!')
+    if weights is not None:
+      weights = np.asarray(weights, float)[np.asarray(zList) > 0]
+    a,cod,res,wt = wlsqfit('ari' if kind=='ari' else 'poly2d', z, x, y,
+      weights, robust)
+    return (a, cod, res, wt) if full else (a, cod)
   if kind == 'ari':
     if not a:
       a = [1.0 for i in range(10)]
@@ -188,3 +202,13 @@ if __name__=='__main__':
   print(kind, list(a), round(cod,5))
   print(get_outlier(a, te, tc, qe, factor, kind))
 
+  # a bad reading, robust fits ignore it
+  qe[3][5] = 20001
+  a, cod = CurveFit(te, tc, qe, a0, factor, kind)
+  print('leastsq', round(polyARI(a, 4.44, 48.89), 4), round(cod,5))
+  for robust in ('huber', 'tukey'):
+    a, cod, res, wt = CurveFit(te, tc, qe, factor=factor, robust=robust, full=True)
+    i = np.argmin(wt)
+    print(robust, round(polyARI(a, 4.44, 48.89), 4), round(cod,5),
+      'worst point', i, 'resid', round(res[i],4), 'weight', round(wt[i],4))
+
@@ -14,7 +14,10 @@ __all__ = ['Quad', 'Cubic', 'PolyEval', 'PolyEvalH', 'ExpFunc',
   'ExpAssocFunc2', 'ExpAssocFunc3', 'SatGrowthFunc', 
   'GompertzFunc', 'LogisticFunc', 'RichardsFunc', 'MMFFunc', 
   'WeibullFunc', 'SinusoidalFunc', 'GaussianFunc', 
-  'HyperbolicFunc', 'HeatCapacityFunc', 'RationalFunc']
+  'HyperbolicFunc', 'HeatCapacityFunc', 'RationalFunc',
+  'QuadD', 'CubicD', 'PolyEvalD', 'ExpFuncD', 'ModExpFuncD', 'LogFuncD',
+  'PowerFuncD', 'ModPowerFuncD', 'ExpAssocFunc2D', 'SatGrowthFuncD',
+  'GompertzFuncD', 'LogisticFuncD', 'HyperbolicFuncD']
 
 def Quad(x,coeff):
   'quadratic (hard coded for speed)'
@@ -193,6 +196,96 @@ def RationalFunc(x,coeff):
   return (a + b*x) / (1.0 + x*(c + x*d))
 
 
+# ---------------------------------------------------------------------
+
+# Closed forms with derivatives, f(x), df/dx and d2f/dx2.
+# Use these with the uroot methods (fd=True) to skip the finite
+# difference slope, e.g. Halley(lambda x: ExpFuncD(x,coeff), fd=True).
+
+def QuadD(x,coeff):
+  'quadratic with derivatives'
+  a,b,c = coeff
+  return a + x*(b + x*c), b + 2.0*c*x, 2.0*c
+
+def CubicD(x,coeff):
+  'cubic with derivatives'
+  a,b,c,d = coeff
+  return a + x*(b + x*(c + x*d)), b + x*(2.0*c + 3.0*d*x), 2.0*c + 6.0*d*x
+
+def PolyEvalD(x,a):
+  'polynomial with derivatives (Horner)'
+  p = q = r = 0.0
+  for c in reversed(a):
+    r = r*x + q
+    q = q*x + p
+    p = p*x + c
+  return p, q, 2.0*r
+
+def ExpFuncD(x,coeff):
+  'exponential function with derivatives'
+  a,b = coeff
+  y = a * math.exp(b*x)
+  return y, b*y, b*b*y
+
+def ModExpFuncD(x,coeff):
+  'modified exponential function with derivatives'
+  a,b = coeff
+  y = a * math.exp(b / x)
+  dy = -b * y / (x*x)
+  return y, dy, -dy * (b + 2.0*x) / (x*x)
+
+def LogFuncD(x,coeff):
+  'natural log function with derivatives'
+  a,b = coeff
+  return a + b * math.log(x), b / x, -b / (x*x)
+
+def PowerFuncD(x,coeff):
+  'power function with derivatives'
+  a,b = coeff
+  y = a * x**b
+  return y, b*y/x, b*(b-1.0)*y/(x*x)
+
+def ModPowerFuncD(x,coeff):
+  'modified power function with derivatives'
+  a,b = coeff
+  y = a * b**x
+  k = math.log(b)
+  return y, k*y, k*k*y
+
+def ExpAssocFunc2D(x,coeff):
+  'exponential associative function (2 coeff) with derivatives'
+  a,b = coeff
+  e = math.exp(-b*x)
+  return a * (1.0 - e), a*b*e, -a*b*b*e
+
+def SatGrowthFuncD(x,coeff):
+  'saturation growth model with derivatives'
+  a,b = coeff
+  d = b + x
+  return a * x / d, a*b/(d*d), -2.0*a*b/(d*d*d)
+
+def GompertzFuncD(x,coeff):
+  'gompertz function with derivatives'
+  a,b,c = coeff
+  u = math.exp(b - c*x)
+  y = a * math.exp(-u)
+  return y, c*u*y, c*c*u*y*(u - 1.0)
+
+def LogisticFuncD(x,coeff):
+  'logistic function with derivatives'
+  a,b,c = coeff
+  u = math.exp(b - c*x)
+  d = 1.0 + u
+  y = a / d
+  dy = a*c*u/(d*d)
+  return y, dy, c*dy*(u - 1.0)/d
+
+def HyperbolicFuncD(x,coeff):
+  'hyperbolic function with derivatives'
+  a,b = coeff
+  return a + b / x, -b / (x*x), 2.0*b / (x*x*x)
+
+
 # ---------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -302,3 +395,17 @@ if __name__ == '__main__':
   z = RationalFunc(x,(a,b,c,d))
   print(f'Rational      : {z:0.4g}')
 
+  # check the derivative forms against central differences
+  h = 1e-4
+  for F, D, coeff in [(Quad, QuadD, (a,b,c)), (Cubic, CubicD, (a,b,c,d)),
+    (PolyEval, PolyEvalD, [a,b,c,d]), (ExpFunc, ExpFuncD, (a,b)),
+    (ModExpFunc, ModExpFuncD, (a,b)), (LogFunc, LogFuncD, (a,b)),
+    (PowerFunc, PowerFuncD, (a,b)), (ModPowerFunc, ModPowerFuncD, (a,b)),
+    (ExpAssocFunc2, ExpAssocFunc2D, (a,b)), (SatGrowthFunc, SatGrowthFuncD, (a,b)),
+    (GompertzFunc, GompertzFuncD, (a,b,c)), (LogisticFunc, LogisticFuncD, (a,b,c)),
+    (HyperbolicFunc, HyperbolicFuncD, (a,b))]:
+    y, dy, d2y = D(x, coeff)
+    f0, f1, f2 = F(x-h, coeff), F(x, coeff), F(x+h, coeff)
+    e = max(abs(y-f1), abs(dy-(f2-f0)/2/h), abs(d2y-(f2-2*f1+f0)/h/h))
+    print(f'{D.__name__:14s}: {y:0.4g} {dy:0.4g} {d2y:0.4g} (err {e:0.1e})')
+
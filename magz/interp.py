@@ -4,7 +4,10 @@ Bruce Wernick
 10 June 2021
 """
 
-__all__ = ['binary_search', 'interp']
+import numpy as np
+from banded import tridag, cyclic
+
+__all__ = ['binary_search', 'interp', 'spline']
 
 def binary_search(dat, key, x):
   """binary search for array of dict.
@@ -49,7 +52,13 @@ def locate(x, p, n):
       H = m
   return L, H
 
-def spline(x, y, yp1=1e99, ypn=1e99):
+def spline(x, y, yp1=1e99, ypn=1e99, periodic=False):
+  """Cubic spline through the points (x, y), returns the interpolation
+  function. yp1 and ypn are the end slopes, 1e99 or more for a natural
+  end. periodic=True (y[0] equal to y[n-1]) matches the slope and the
+  curvature at the ends. The second derivatives are one tridiagonal
+  solve (banded.tridag, banded.cyclic when periodic).
+  """
 
   def interp(p):
     'spline interpolation function'
@@ -62,27 +71,26 @@ def spline(x, y, yp1=1e99, ypn=1e99):
     return a*y[L]+b*y[H]+((a*a*a-a)*y2[L]+(b*b*b-b)*y2[H])*(dx*dx)/6.0
 
   n = len(x)
-  u = vector(n)
-  y2 = vector(n)
-  if yp1 > 0.99e99:
-    y2[0] = u[0] = 0.0
-  else:
-    y2[0] = -0.5
-    u[0] = (3.0/(x[2]-x[1]))*((y[2]-y[1])/(x[2]-x[1])-yp1)
-  for i in range(1, n-1):
-    sig = (x[i]-x[i-1])/(x[i+1]-x[i-1])
-    p = sig*y2[i-1]+2.0
-    y2[i] = (sig-1.0)/p
-    u[i] = (y[i+1]-y[i])/(x[i+1]-x[i])-(y[i]-y[i-1])/(x[i]-x[i-1])
-    u[i] = (6.0*u[i]/(x[i+1]-x[i-1])-sig*u[i-1])/p
-  if ypn > 0.99e99:
-    qn = un = 0.0
-  else:
-    qn = 0.5
-    un = (3.0/(x[n-1]-x[n-2]))*(ypn-(y[n-1]-y[n-2])/(x[n-1]-x[n-2]))
-  y2[n-1] = (un-qn*u[n-2])/(qn*y2[n-2]+1.0)
-  for k in range(n-2,-1,-1):
-    y2[k] = y2[k]*y2[k+1]+u[k]
+  h = np.diff(np.asarray(x, dtype=float))
+  s = np.diff(np.asarray(y, dtype=float))/h
+  if periodic:
+    if n < 4:
+      raise ValueError('periodic spline needs 4 points or more!')
+    hm = np.roll(h, 1)
+    a, b, c = hm/6.0, (hm+h)/3.0, h/6.0
+    y2 = cyclic(a, b, c, c[-1], a[0], s-np.roll(s, 1))
+    y2 = np.append(y2, y2[0]).tolist()
+    return interp
+  a, b, c, r = np.zeros(n), np.ones(n), np.zeros(n), np.zeros(n)
+  a[1:-1] = h[:-1]/6.0
+  b[1:-1] = (h[:-1]+h[1:])/3.0
+  c[1:-1] = h[1:]/6.0
+  r[1:-1] = s[1:]-s[:-1]
+  if yp1 < 0.99e99:
+    b[0], c[0], r[0] = h[0]/3.0, h[0]/6.0, s[0]-yp1
+  if ypn < 0.99e99:
+    a[-1], b[-1], r[-1] = h[-1]/6.0, h[-1]/3.0, ypn-s[-1]
+  y2 = tridag(a, b, c, r).tolist()
 
   return interp
 
@@ -97,3 +105,14 @@ if __name__ == '__main__':
   y = [2.0, 8.0, 32.0, 8.0, 2.0]
   fx = spline(x, y)
   print(fx(2.5))
+
+  # periodic spline of sin on one cycle, a long table
+  from math import sin, pi
+  from time import perf_counter
+  x = [2.0*pi*i/20000 for i in range(20001)]
+  y = [sin(v) for v in x]
+  y[-1] = y[0]
+  t = perf_counter()
+  fx = spline(x, y, periodic=True)
+  t = perf_counter() - t
+  print(f'periodic n={len(x)}: {t:0.3f}s, err {max(abs(fx(v)-sin(v)) for v in (0.001, 1.0, 3.0, 6.28)):0.2g}')
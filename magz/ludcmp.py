@@ -1,129 +1,105 @@
 """
 LU Decomposition.
 Reference: NR3 C++
+  - array backed, a block of right hand sides in one solve.
 Bruce Wernick
 10 June 2021
 """
 
-from copy import deepcopy
-from nrutils import vector
+import numpy as np
+from scipy.linalg import solve_triangular
+
+__all__ = ['LUdcmp']
 
 TINY = 1.0e-40
 
+def fill(x, r):
+  "copy the result r into the NR output argument x (array or list)"
+  if isinstance(x, np.ndarray):
+    x[...] = r
+  elif x is not None:
+    x[:] = r.tolist()
+  return r
+
 class LUdcmp():
   """LU decomposition class
+  Crout's method with implicit partial pivoting (NR3), on a numpy
+  array with one vectorized row update per column. Factor once, then
+  solveVec or solveMat (one right hand side per column) do the
+  forward and back substitution as two triangular solves.
+  The results are returned as arrays, x (optional, as in NR) is
+  filled in too.
   """
   def __init__(self, a):
-    n = len(a)
+    self.aref = np.array(a, dtype=float)
+    n = len(self.aref)
+    if self.aref.shape != (n, n):
+      raise ValueError("LUdcmp needs a square matrix!")
     self.n = n
-    self.lu = deepcopy(a)
-    self.aref = deepcopy(a)
-    self.indx = vector(n, 0)
-    vv = vector(n)
+    lu = self.aref.copy()
+    big = np.max(np.abs(lu), axis=1)
+    if np.any(big == 0.0):
+      raise ValueError("Singular matrix in LUdcmp!")
+    vv = 1.0 / big
+    self.indx = np.zeros(n, dtype=int)
     self.d = 1
-    for i in range(n):
-      big = 0
-      for j in range(n):
-        temp = abs(self.lu[i][j])
-        if temp > big:
-          big = temp
-      if big == 0:
-        nrerror("Singular matrix in LUdcmp")
-      vv[i] = 1 / big
     for k in range(n):
-      big = 0
-      imax = k
-      for i in range(k, n):
-        temp = vv[i] * abs(self.lu[i][k])
-        if temp > big:
-          big = temp
-          imax = i
+      imax = k + int(np.argmax(vv[k:] * np.abs(lu[k:, k])))
       if k != imax:
-        for j in range(n):
-          temp = self.lu[imax][j]
-          self.lu[imax][j] = self.lu[k][j]
-          self.lu[k][j] = temp
+        lu[[k, imax]] = lu[[imax, k]]
         self.d = -self.d
         vv[imax] = vv[k]
       self.indx[k] = imax
-      if self.lu[k][k] == 0:
-        self.lu[k][k] = TINY
-      for i in range(k+1, n):
-        self.lu[i][k] /= self.lu[k][k]
-        temp = self.lu[i][k]
-        for j in range(k+1, n):
-          self.lu[i][j] -= temp*self.lu[k][j]
-
-  def solveVec(self, _b, _x):
-    n = self.n
-    b = deepcopy(_b)
-    x = deepcopy(_x)
-    ii = 0
-    if (len(b) != n or len(x) != n):
-      nrerror("LUdcmp::solve bad sizes")
-    for i in range(n):
-      x[i] = b[i]
-    for i in range(n):
-      ip = self.indx[i]
-      sum = x[ip]
-      x[ip] = x[i]
-      if ii != 0:
-        for j in range(ii-1, i):
-          sum -= self.lu[i][j] * x[j]
-      elif sum != 0.0:
-        ii = i + 1
-      x[i] = sum
-    for i in range(n-1, -1, -1):
-      sum = x[i]
-      for j in range(i+1, n):
-        sum -= self.lu[i][j] * x[j]
-      x[i] = sum / self.lu[i][i]
-    return x
-
-  def solveMat(self, _b, _x):
+      if lu[k, k] == 0.0:
+        lu[k, k] = TINY
+      lu[k+1:, k] /= lu[k, k]
+      lu[k+1:, k+1:] -= np.outer(lu[k+1:, k], lu[k, k+1:])
+    self.lu = lu
+    # row order of b, the interchanges of indx applied in turn
+    self.perm = np.arange(n)
+    for k, i in enumerate(self.indx):
+      self.perm[[k, i]] = self.perm[[i, k]]
+
+  def solve(self, b):
+    "x for a vector b, or X for a block b (n x m)"
+    b = np.asarray(b, dtype=float)
+    if b.shape[0] != self.n:
+      raise ValueError("LUdcmp::solve bad sizes!")
+    y = solve_triangular(self.lu, b[self.perm], lower=True,
+      unit_diagonal=True, check_finite=False)
+    return solve_triangular(self.lu, y, check_finite=False)
+
+  def solveVec(self, b, x=None):
+    "solve for one right hand side"
+    if np.ndim(b) != 1:
+      raise ValueError("LUdcmp::solveVec b must be a vector!")
+    return fill(x, self.solve(b))
+
+  def solveMat(self, b, x=None):
     """
-    b is a matrix
+    b is a matrix, one right hand side per column
     """
-    b = deepcopy(_b)
-    x = deepcopy(_x)
-    n = self.n
-    m = len(b[0])
-    if (len(b) != n or len(x) != n or m != len(x[0])):
-      nrerror("LUdcmp::solve bad sizes")
-    xx = vector(n)
-    for j in range(m):
-      for i in range(n):
-        xx[i] = b[i][j]
-      solveVec(xx, xx)
-      for i in range(n):
-        x[i][j] = xx[i]
-    return x
-
-  def inverse(self, ainv):
-    ainv = matrix(n, n)
-    for i in range(n):
-      for j in range(n):
-        ainv[i][j] = 0
-      ainv[i][i] = 1
-    solveMat(ainv, ainv)
+    if np.ndim(b) != 2:
+      raise ValueError("LUdcmp::solveMat b must be a matrix!")
+    return fill(x, self.solve(b))
+
+  def inverse(self, ainv=None):
+    "inverse of a"
+    return fill(ainv, self.solve(np.eye(self.n)))
 
   def det(self):
-    dd = self.d
-    for i in range(self.n):
-      dd *= self.lu[i][i]
-    return dd
+    "determinant of a"
+    return self.d * float(np.prod(np.diag(self.lu)))
 
   def mprove(self, b, x):
-    n = self.n
-    r = vector(n)
-    for i in range(n):
-      sdp = -b[i]
-      for j in range(n):
-        sdp += aref[i][j] * x[j]
-      r[i] = sdp
-    solveVec(r, r)
-    for i in range(n):
-      x[i] -= r[i]
+    """Improve the solution x of a.x = b (vector or block) by one
+    step of iterative refinement, the residual is summed in extended
+    precision. x is updated and returned.
+    """
+    xd = np.asarray(x, dtype=float)
+    r = self.aref.astype(np.longdouble) @ xd.astype(np.longdouble)
+    r -= np.asarray(b, dtype=np.longdouble)
+    return fill(x, xd - self.solve(r.astype(float)))
 
 
 # ---------------------------------------------------------------------
@@ -134,3 +110,36 @@ if __name__=="__main__":
   A = [[8,1,6],[4,9,2],[0,5,7]]
   lud = LUdcmp(A)
   print(lud.lu)
+  print('det', lud.det()) # 516
+  x = lud.solveVec([15, 15, 12]) # [1,1,1]
+  print('x', x)
+  print('inverse check', np.max(np.abs(lud.inverse() @ np.array(A) - np.eye(3))))
+  print()
+
+  # refinement on an ill conditioned (Hilbert) matrix
+  n = 10
+  H = 1.0 / (np.arange(n)[:, None] + np.arange(n) + 1.0)
+  xt = np.ones(n)
+  b = H @ xt
+  lud = LUdcmp(H)
+  x = lud.solveVec(b)
+  res = lambda x: float(np.max(np.abs(H.astype(np.longdouble) @ x - b)))
+  print(f'Hilbert({n}) residual {res(x):0.2g}', end='')
+  for i in range(2):
+    lud.mprove(b, x)
+    print(f', {res(x):0.2g}', end='')
+  print()
+  print()
+
+  # factor a jacobian once, solve many right hand sides
+  from time import perf_counter
+  n, m = 300, 50
+  J = np.random.uniform(-1, 1, (n, n)) + n*np.eye(n)
+  B = np.random.uniform(-1, 1, (n, m))
+  t = perf_counter()
+  lud = LUdcmp(J)
+  t = perf_counter() - t
+  ts = perf_counter()
+  X = lud.solveMat(B)
+  ts = perf_counter() - ts
+  print(f'factor {n}x{n} {t:0.3f}s, {m} solves {ts:0.4f}s, max err {np.max(np.abs(J @ X - B)):0.2g}')
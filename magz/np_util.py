@@ -6,7 +6,7 @@ Bruce Wernick
 
 import numpy as np
 
-__all__ = ['polyfit']
+__all__ = ['polyfit', 'Lanes']
 
 def polyfit(x, y, deg):
   "polynomial curvefit using numpy"
@@ -17,6 +17,56 @@ def polyfit(x, y, deg):
   return c, r2
 
 
+class Lanes(object):
+
+  """Lane bookkeeping of the batch solvers (uroot_np, uroot2d_np).
+     Lane i is an independent problem with per-lane args. idx are the
+     lanes still active, args is cut to match. A lane that is done is
+     retired with its root (nan when it failed), its iteration count
+     it and ok, and dropped from the working state. root is one array,
+     or m rows for m unknowns. The class using it sets maxi.
+  """
+
+  def start(self, starts, args, m=None):
+    "broadcast the start arrays and args, allocate the results"
+    arrs = np.broadcast_arrays(*[np.asarray(v, float) for v in starts],
+      *[np.asarray(p) for p in args])
+    k = len(starts)
+    self.shape = arrs[0].shape
+    n = arrs[0].size
+    self.root = np.full((n,) if m is None else (m, n), np.nan)
+    self.its = np.full(n, self.maxi, dtype=int)
+    self.ok = np.zeros(n, dtype=bool)
+    self.idx = np.arange(n)
+    self.args = tuple(p.ravel() for p in arrs[k:])
+    self.it = 0
+    return [v.ravel().copy() for v in arrs[:k]]
+
+  def retire(self, done, root, state, ok=True):
+    """store the lanes that are done and drop them from the state.
+       root is an array, or a tuple of m arrays. returns the compacted
+       state tuple.
+    """
+    if not done.any():
+      return state
+    i = self.idx[done]
+    self.root[..., i] = np.asarray(root)[..., done] if ok else np.nan
+    self.its[i] = self.it
+    self.ok[i] = ok
+    keep = ~done
+    self.idx = self.idx[keep]
+    self.args = tuple(p[keep] for p in self.args)
+    return tuple(s[keep] for s in state)
+
+  def result(self):
+    "roots reshaped to the broadcast input shape, a tuple for m unknowns"
+    self.its = self.its.reshape(self.shape)
+    self.ok = self.ok.reshape(self.shape)
+    if self.root.ndim == 1:
+      return self.root.reshape(self.shape)
+    return tuple(r.reshape(self.shape) for r in self.root)
+
+
 # ---------------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -0,0 +1,280 @@
+"""
+Polynomial roots.
+Companion matrix and Newton deflation, all real roots in one call.
+A multiple root is returned once per multiplicity.
+Coefficients are in ascending order a[0] + a[1]*x + ... as used by
+poly.polyeval and funcs.PolyEval. Use high=True for the descending
+order of svd.polyfit and np_util.polyfit.
+"""
+
+import numpy as np
+from const import EPS
+from poly import polydval
+
+__all__ = ['companion', 'polyroots', 'newton_deflate', 'polyroots_batch']
+
+
+def trim(a, high=False):
+  'ascending float list without the zero high order terms'
+  a = [float(c) for c in (reversed(a) if high else a)]
+  while a and a[-1] == 0.0:
+    a.pop()
+  if not a:
+    raise ValueError('zero polynomial!')
+  return a
+
+
+def polish(a, x, its=3):
+  'a few Newton steps on the full polynomial, while |p| goes down'
+  p, dp = polydval(a, x)
+  for _ in range(its):
+    if dp == 0.0 or isroot(a, x):
+      break
+    xn = x - p / dp
+    pn, dpn = polydval(a, xn)
+    if abs(pn) >= abs(p):
+      break
+    x, p, dp = xn, pn, dpn
+  return x
+
+
+def companion(a):
+  'companion matrix of the ascending coefficients a'
+  n = len(a) - 1
+  C = np.zeros((n, n))
+  C[1:, :-1] = np.eye(n-1)
+  C[:, -1] = -np.asarray(a[:n]) / a[n]
+  return C
+
+
+def isroot(a, x):
+  'x is a root of a to rounding (backward error of Horner)'
+  p = s = 0.0
+  for c in reversed(a):
+    p = p*x + c
+    s = s*abs(x) + abs(c)
+  return abs(p) <= 4.0*len(a)*EPS*s
+
+
+def realroots(a, z, imtol=1e-7):
+  """real parts of the eigenvalues z of a that are real within imtol.
+     A multiple root splits into a small complex cluster (about
+     EPS**(1/m) wide for multiplicity m), those are kept when their
+     real part is a root of a to rounding, one per eigenvalue.
+  """
+  return [float(v.real) for v in z
+    if abs(v.imag) <= imtol * max(1.0, abs(v.real)) or isroot(a, v.real)]
+
+
+def polyroots(a, high=False, method='eig', imtol=1e-7):
+
+  """All real roots of the polynomial a, sorted.
+     method 'eig' uses the companion matrix eigenvalues (numpy),
+     method 'newton' uses Newton with deflation (pure Python).
+     The roots are polished by Newton on the original polynomial.
+     A multiple root is repeated, as in np.roots.
+  """
+
+  a = trim(a, high)
+  if len(a) == 1:
+    return []
+
+  if method == 'newton':
+    return newton_deflate(a)
+
+  if method != 'eig':
+    raise ValueError(f'unknown method {method}!')
+
+  # roots at zero
+  k = 0
+  while a[k] == 0.0:
+    k += 1
+  b = a[k:]
+
+  xs = [0.0]*k
+  if len(b) > 1:
+    xs += [polish(a, x) for x in realroots(b, np.linalg.eigvals(companion(b)), imtol)]
+  return sorted(xs)
+
+
+def bairstow(a, tol=1e-12, maxi=64):
+
+  """Quadratic factor x^2 - r*x - s of a by Bairstow's method.
+     Returns r, s and the quotient (ascending), or None when it does
+     not converge.
+  """
+
+  n = len(a) - 1
+  r, s = (-a[1]/a[2], -a[0]/a[2]) if a[2] != 0.0 else (0.0, -1.0)
+  for its in range(maxi):
+    b = [0.0]*(n+1)
+    c = [0.0]*(n+1)
+    b[n] = c[n] = a[n]
+    b[n-1] = a[n-1] + r*b[n]
+    c[n-1] = b[n-1] + r*c[n]
+    for k in range(n-2, -1, -1):
+      b[k] = a[k] + r*b[k+1] + s*b[k+2]
+      c[k] = b[k] + r*c[k+1] + s*c[k+2]
+    if n == 2:
+      return r, s, b[2:]
+    det = c[2]*c[2] - c[1]*c[3]
+    if det == 0.0:
+      r, s = r + 0.5, s - 0.5
+      continue
+    dr = (c[3]*b[0] - c[2]*b[1]) / det
+    ds = (c[1]*b[1] - c[2]*b[0]) / det
+    r += dr
+    s += ds
+    if abs(dr) <= tol*(1.0 + abs(r)) and abs(ds) <= tol*(1.0 + abs(s)):
+      return r, s, b[2:]
+  return None
+
+
+def newton_deflate(a, high=False, tol=1e-12, maxi=64):
+
+  """Real roots by Newton (poly.polydval) with deflation.
+     Each root found is divided out of the polynomial, and the next
+     search starts from it. When Newton finds no real root from there
+     (a complex pair) a quadratic factor is divided out by Bairstow,
+     if that fails too the rest is done by the companion matrix.
+  """
+
+  a0 = trim(a, high)
+  a = list(a0)
+  xs = []
+  x = 0.0
+
+  while len(a) > 2:
+
+    if a[0] == 0.0:
+      x = 0.0
+    else:
+      for its in range(maxi):
+        p, dp = polydval(a, x)
+        if dp == 0.0:
+          x += 0.1 * (1.0 + abs(x))
+          continue
+        dx = p / dp
+        x -= dx
+        if abs(dx) <= tol * (1.0 + abs(x)):
+          break
+      else:
+        # slow (linear) convergence to a multiple root is still a root
+        if not isroot(a, x):
+          q = bairstow(a, tol, maxi)
+          if q is None:
+            xs += realroots(a0, np.linalg.eigvals(companion(a)))
+            a = []
+            break
+          r, s, a = q
+          d = r*r + 4.0*s
+          if d >= 0.0:
+            xs += [0.5*(r - d**0.5), 0.5*(r + d**0.5)]
+          elif isroot(a0, 0.5*r):
+            xs += [0.5*r, 0.5*r]
+          x = 0.5*r
+          continue
+
+    xs.append(x)
+
+    # synthetic division by (x - r)
+    n = len(a) - 1
+    b = [0.0]*n
+    b[n-1] = a[n]
+    for k in range(n-1, 0, -1):
+      b[k-1] = a[k] + x * b[k]
+    a = b
+
+  if len(a) == 2:
+    xs.append(-a[0] / a[1])
+
+  return sorted(polish(a0, x) for x in xs)
+
+
+def polyroots_batch(A, high=False, imtol=1e-7):
+
+  """Real roots of many polynomials of the same degree at once.
+     A is a 2D array, one coefficient set per row. The companion
+     matrices are solved as one stack. Returns an (m, n) array of
+     sorted roots padded with nan. A multiple root is repeated.
+  """
+
+  A = np.array(A, dtype=float)
+  if high:
+    A = A[:, ::-1]
+  m, n = A.shape[0], A.shape[1] - 1
+
+  R = np.full((m, n), np.nan)
+  lead = A[:, n] != 0.0
+
+  # rows with a zero leading coefficient are done one at a time
+  for i in np.nonzero(~lead)[0]:
+    xs = polyroots(A[i])
+    R[i, :len(xs)] = xs
+
+  B = A[lead]
+  C = np.zeros((len(B), n, n))
+  C[:, 1:, :-1] = np.eye(n-1)
+  C[:, :, -1] = -B[:, :n] / B[:, n:]
+  z = np.linalg.eigvals(C)
+
+  # real within imtol, or the real part is a root to rounding (the
+  # complex cluster of a multiple root), as realroots
+  x = z.real
+  p = np.zeros_like(x)
+  s = np.zeros_like(x)
+  for c in B[:, ::-1].T:
+    p = p * x + c[:, None]
+    s = s * np.abs(x) + np.abs(c[:, None])
+  real = (np.abs(z.imag) <= imtol * np.maximum(1.0, np.abs(x))) | \
+    (np.abs(p) <= 4.0*(n+1)*EPS*s)
+  x = np.where(real, x, np.nan)
+
+  # polish by Newton (Horner over the whole stack), a step is kept
+  # where |p| goes down, as polish
+  def horner(x):
+    p = np.zeros_like(x)
+    dp = np.zeros_like(x)
+    for c in B[:, ::-1].T:
+      dp = dp * x + p
+      p = p * x + c[:, None]
+    return p, dp
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    p, dp = horner(x)
+    for _ in range(3):
+      xn = np.where(dp != 0.0, x - p/dp, x)
+      pn, dpn = horner(xn)
+      step = np.abs(pn) < np.abs(p)
+      x = np.where(step, xn, x)
+      p = np.where(step, pn, p)
+      dp = np.where(step, dpn, dp)
+
+  R[lead] = np.sort(x, axis=1)
+  return R
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  # (x-2)(x+3)(x-0.5)(x^2+1)
+  a = list(np.polynomial.polynomial.polyfromroots([2, -3, 0.5, 1j, -1j]).real)
+  print('eig   :', polyroots(a))
+  print('newton:', polyroots(a, method='newton'))
+
+  # fitted by svd.polyfit, high order first
+  from svd import polyfit, polyh
+  x = [float(i) for i in range(-5, 6)]
+  y = [polyh([1.0, 0.5, -7.0, 1.5], xi) for xi in x]
+  c, R2a = polyfit(x, y, 3)
+  print('svd   :', polyroots(c, high=True))
+
+  # many coefficient sets at once
+  from time import perf_counter
+  A = np.random.uniform(-1, 1, (20000, 5))
+  t = perf_counter()
+  R = polyroots_batch(A)
+  t = perf_counter() - t
+  print(f'batch : {len(A)} quartics in {t:0.3f}s, real roots={np.isfinite(R).sum()}')
+  print('check :', R[0], polyroots(A[0]))
@@ -0,0 +1,224 @@
+"""
+Sparse linear solvers.
+CSR assembly from network edge lists, sparse LU and preconditioned CG.
+Memory scales with the number of nonzeros, not n^2.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu, spilu, cg, LinearOperator
+
+__all__ = ['numbering', 'incidence', 'laplacian', 'loops', 'grounded',
+  'SparseLU', 'CG', 'spsolve']
+
+
+def numbering(edges):
+  'index of each node name, in order of first appearance'
+  index = {}
+  for e in edges:
+    for n in e[:2]:
+      index.setdefault(n, len(index))
+  return index
+
+
+def incidence(edges, index=None):
+
+  """Node-edge incidence matrix (csr) of the edges (inlet, outlet, ...)
+     as used in edge_triple. One column per edge, -1 at the inlet and
+     +1 at the outlet, so A @ q is the net inflow at each node.
+     index maps the node names to rows (see numbering).
+  """
+
+  index = numbering(edges) if index is None else index
+  m = len(edges)
+  i = [index[e[0]] for e in edges] + [index[e[1]] for e in edges]
+  v = np.repeat([-1.0, 1.0], m)
+  return sparse.csr_matrix((v, (i, np.tile(np.arange(m), 2))),
+    shape=(len(index), m))
+
+
+def laplacian(edges, g=None, index=None):
+
+  """Nodal conductance matrix L = A diag(g) A' (csr) of the edges.
+     g is the conductance of each edge, by default the edge weights
+     e[2]. L is symmetric and singular (rows sum to zero) until a
+     reference node is removed (see grounded).
+  """
+
+  A = incidence(edges, index)
+  g = [e[2] for e in edges] if g is None else g
+  return (A @ sparse.diags(np.asarray(g, dtype=float)) @ A.T).tocsr()
+
+
+def loops(meshes, nedges):
+
+  """Mesh-edge matrix (csr) of the hardy-cross mesh lists.
+     Each mesh is a list of signed edge numbers, +e when the mesh runs
+     along edge e and -e against it (so edge 0 is not used).
+  """
+
+  i, j, v = [], [], []
+  for k, mesh in enumerate(meshes):
+    for e in mesh:
+      i.append(k)
+      j.append(abs(e))
+      v.append(1.0 if e > 0 else -1.0)
+  return sparse.csr_matrix((v, (i, j)), shape=(len(meshes), nedges))
+
+
+def grounded(L, b, ref=0):
+
+  """Remove the reference node ref (potential zero) from the network
+     matrix L and the nodal inflow b. Returns the reduced L (csr),
+     the reduced b and the index of the nodes that are kept.
+  """
+
+  L = sparse.csr_matrix(L)
+  keep = np.delete(np.arange(L.shape[0]), ref)
+  return L[keep][:, keep].tocsr(), np.asarray(b, dtype=float)[keep], keep
+
+
+class SparseLU(object):
+
+  """Sparse LU factors of A (SuperLU, splu), for repeated solves.
+     solve(b) takes a vector or a block of right hand sides.
+  """
+
+  def __init__(self, A):
+    A = sparse.csc_matrix(A, dtype=float)
+    if A.shape[0] != A.shape[1]:
+      raise ValueError('SparseLU needs a square matrix!')
+    try:
+      self.lu = splu(A)
+    except RuntimeError:
+      raise ValueError('Singular matrix in SparseLU!')
+
+  def solve(self, b):
+    'x for a vector b, or X for a block b (n x m)'
+    return self.lu.solve(np.asarray(b, dtype=float))
+
+
+class CG(object):
+
+  """Conjugate gradient solver for a symmetric positive definite A.
+     precond is 'jacobi' (inverse diagonal), 'ilu' (incomplete LU from
+     spilu with drop_tol=drop and fill_factor=fill) or None. The
+     preconditioner is made once, each call solves one b. its is the
+     iteration count of the last solve.
+  """
+
+  tol = 1e-10
+  maxi = None
+
+  def __init__(self, A, precond='jacobi', tol=None, maxi=None, drop=1e-4,
+    fill=4.0):
+    self.A = sparse.csr_matrix(A, dtype=float)
+    self.tol = self.tol if tol is None else tol
+    self.maxi = self.maxi if maxi is None else maxi
+    self.its = 0
+    if precond == 'jacobi':
+      d = self.A.diagonal()
+      if np.any(d == 0.0):
+        raise ValueError('zero on the diagonal!')
+      self.M = sparse.diags(1.0/d).tocsr()
+    elif precond == 'ilu':
+      # modified ILU (row sums kept) in a symmetric order, the factor
+      # is applied directly and symmetrized as CG needs
+      opts = dict(SymmetricMode=True, Equil=False, ILU_MILU='SMILU_2')
+      ilu = spilu(self.A.tocsc(), drop_tol=drop, fill_factor=fill,
+        permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0, options=opts)
+      self.M = LinearOperator(self.A.shape,
+        matvec=lambda b: 0.5*(ilu.solve(b) + ilu.solve(b, trans='T')))
+    elif precond is None:
+      self.M = None
+    else:
+      raise ValueError(f'unknown preconditioner {precond}!')
+
+  def count(self, xk):
+    self.its += 1
+
+  def __call__(self, b, x0=None):
+    'x for the vector b'
+    self.its = 0
+    x, info = cg(self.A, np.asarray(b, dtype=float), x0=x0, rtol=self.tol,
+      maxiter=self.maxi, M=self.M, callback=self.count)
+    if info > 0:
+      raise ValueError('max iterations reached!')
+    if info < 0:
+      raise ValueError('illegal input in CG!')
+    return x
+
+
+def spsolve(A, b, method='lu', precond='jacobi', tol=None):
+
+  """Solve A x = b for a sparse A.
+     method 'lu' uses SparseLU, 'cg' uses CG with precond (A must be
+     symmetric positive definite).
+  """
+
+  if method == 'lu':
+    return SparseLU(A).solve(b)
+  if method == 'cg':
+    return CG(A, precond, tol)(b)
+  raise ValueError(f'unknown method {method}!')
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  from time import perf_counter
+
+  # julie bridge (edge_triple) with conductances, 1 unit in at node 1
+  # and out at node 5
+  graph = [(1, 2, 1.0), (1, 4, 2.0), (2, 3, 0.5), (4, 3, 1.5),
+           (2, 5, 1.0), (3, 5, 2.0), (4, 5, 0.5)]
+  index = numbering(graph)
+  L = laplacian(graph, index=index)
+  b = np.zeros(len(index))
+  b[index[1]], b[index[5]] = 1.0, -1.0
+  Lr, br, keep = grounded(L, b, index[5])
+  p = np.zeros(len(index))
+  p[keep] = spsolve(Lr, br)
+  q = [g*(p[index[i]]-p[index[o]]) for i, o, g in graph]
+  print('bridge flows', np.round(q, 4))
+  print(f'continuity err {np.max(np.abs(incidence(graph, index) @ q + b)):0.2g}')
+  print()
+
+  # hardy-cross network, all the mesh corrections at once (Newton)
+  r = np.array([0.0, 3.0, 4.0, 10.0, 15.0, 2.0, 6.0, 5.0])
+  q = np.array([0.0, 4.0, 6.0, 1.0, 1.0, 3.0, 2.0, 5.0])
+  M = loops([[-1, 2, 4, -3], [3, 6, -5], [-4, 7, -6]], len(r))
+  for i in range(20):
+    J = M @ sparse.diags(2.0*r*np.abs(q)) @ M.T
+    dq = SparseLU(J).solve(-(M @ (r*np.abs(q)*q)))
+    q += M.T @ dq
+    if np.max(np.abs(dq)) < 1e-10:
+      break
+  print(f'mesh flows after {i+1} steps', np.round(q[1:], 4))
+  print()
+
+  # large grid network, n nodes, grounded at a corner
+  k = 200
+  n = k*k
+  node = np.arange(n).reshape(k, k)
+  pairs = np.vstack([np.column_stack([node[:, :-1].ravel(), node[:, 1:].ravel()]),
+    np.column_stack([node[:-1].ravel(), node[1:].ravel()])])
+  g = np.random.uniform(0.5, 2.0, len(pairs))
+  edges = [(i, o, w) for (i, o), w in zip(pairs.tolist(), g.tolist())]
+  t = perf_counter()
+  L = laplacian(edges, index={i: i for i in range(n)})
+  b = np.random.uniform(-1.0, 1.0, n)
+  b -= b.mean()
+  Lr, br, keep = grounded(L, b, 0)
+  t = perf_counter() - t
+  print(f'grid: {n} nodes, {len(edges)} edges, nnz {Lr.nnz} ({8e-6*Lr.nnz:0.1f} MB, '
+    f'dense {8e-6*(n-1)**2:0.0f} MB), assembly {t:0.3f}s')
+  for name, solve in (('lu', lambda: SparseLU(Lr).solve(br)),
+    ('cg jacobi', CG(Lr, 'jacobi', 1e-10)), ('cg ilu', CG(Lr, 'ilu', 1e-10)),
+    ('cg', CG(Lr, None, 1e-10))):
+    t = perf_counter()
+    x = solve(br) if isinstance(solve, CG) else solve()
+    t = perf_counter() - t
+    its = f', its {solve.its}' if isinstance(solve, CG) else ''
+    print(f'{name:10s}: {t:0.3f}s, residual {np.max(np.abs(Lr @ x - br)):0.2g}{its}')
@@ -0,0 +1,151 @@
+"""
+Streaming least squares.
+Add and remove observations one at a time and refit in constant time.
+Uses the design matrix terms of svd (1D poly, poly2d, ari or a list).
+"""
+
+import numpy as np
+from svd import design
+
+__all__ = ['StreamFit']
+
+
+class StreamFit(object):
+
+  """Running least squares fit.
+     The normal equations A'A w = A'z and the sums of z and z**2 are
+     accumulated, so add and remove cost O(p**2) for p terms and the
+     coefficients and R2 cost O(p**3), whatever the number of points.
+     The normal matrix is scaled to a unit diagonal before the solve,
+     when its condition number is over maxcond the solve falls back to
+     a truncated least squares (as the SVD fitters zero small w).
+     A row is (x, z) for a 1D polynomial (terms=p) or (x, y, z), each
+     may also be an array of points.
+  """
+
+  def __init__(self, terms='ari', maxcond=1e12):
+    self.terms = terms
+    self.maxcond = maxcond
+    self.p = design(terms, [0.0], [0.0]).shape[1]
+    self.clear()
+
+  def clear(self):
+    'drop all the observations'
+    self.AtA = np.zeros((self.p, self.p))
+    self.Atz = np.zeros(self.p)
+    self.n = 0
+    self.sz = self.szz = 0.0
+    self.cond = None
+    self.w = None
+
+  def update(self, row, sign):
+    'add (sign=1) or remove (sign=-1) the points of a row'
+    *xy, z = [np.atleast_1d(np.asarray(v, float)) for v in row]
+    a = design(self.terms, *xy)
+    self.AtA += sign * (a.T @ a)
+    self.Atz += sign * (a.T @ z)
+    self.n += sign * len(z)
+    self.sz += sign * z.sum()
+    self.szz += sign * (z @ z)
+    self.w = None
+
+  def add(self, *row):
+    'add an observation (x, z) or (x, y, z)'
+    self.update(row, 1.0)
+
+  def remove(self, *row):
+    'remove an observation that was added before'
+    if self.n < 1:
+      raise ValueError('nothing to remove!')
+    self.update(row, -1.0)
+
+  @property
+  def coefs(self):
+    'current coefficients (list), same order as the svd fitters'
+    if self.w is None:
+      if self.n < self.p:
+        raise ValueError('too few points!')
+      d = np.sqrt(np.abs(np.diag(self.AtA)))
+      d[d == 0.0] = 1.0
+      N = self.AtA / np.outer(d, d)
+      self.cond = np.linalg.cond(N)
+      if self.cond < self.maxcond:
+        wd = np.linalg.solve(N, self.Atz / d)
+      else:
+        wd = np.linalg.lstsq(N, self.Atz / d, rcond=1.0/self.maxcond)[0]
+      self.w = wd / d
+    return self.w.tolist()
+
+  @property
+  def R2(self):
+    'coefficient of determination of the current fit'
+    w = np.asarray(self.coefs)
+    sse = self.szz - 2.0*(w @ self.Atz) + w @ self.AtA @ w
+    sst = self.szz - self.sz*self.sz/self.n
+    if sst <= 0.0:
+      return 1.0
+    return 1.0 - max(sse, 0.0)/sst
+
+  @property
+  def R2a(self):
+    'adjusted R2, as returned by the svd fitters'
+    p = self.p - 1
+    return 1.0-(1.0-self.R2)*(self.n-1.0)/(self.n-p)
+
+  def __call__(self, x, y=None):
+    'fitted value(s) at x, y'
+    a = design(self.terms, np.atleast_1d(x), None if y is None else np.atleast_1d(y))
+    z = a @ np.asarray(self.coefs)
+    return float(z[0]) if np.ndim(x) == 0 else z
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  from time import perf_counter
+  from random import uniform, gauss, seed
+  from svd import polyARI, polyARIfit, polyfit, polyh
+
+  seed(1)
+  c = [17.28,0.8397,0.109,0.01513,-0.00703,-0.00566,1.014e-4,-1.563e-4,2.064e-5,3.723e-5]
+  pts = [(uniform(-25.0, 15.0), uniform(25.0, 65.0)) for i in range(300)]
+  rows = [(x, y, polyARI(c, x, y) + gauss(0.0, 0.05)) for x, y in pts]
+
+  print('ARI refit after every new test point')
+  fit = StreamFit('ari')
+  t = perf_counter()
+  for row in rows:
+    fit.add(*row)
+    if fit.n >= fit.p:
+      w, R2a = fit.coefs, fit.R2a
+  t = perf_counter() - t
+  x, y, z = zip(*rows)
+  ts = perf_counter()
+  for k in range(fit.p, len(rows)+1):
+    ws, R2s = polyARIfit(x[:k], y[:k], z[:k])
+  ts = perf_counter() - ts
+  e = max(abs(a-b)/abs(b) for a, b in zip(w, ws))
+  print(f'stream {t:0.3f}s, full refits {ts:0.3f}s, cond {fit.cond:0.3g}')
+  print(f'R2a {R2a:0.6f} vs {R2s:0.6f}, max rel coeff diff {e:0.2g}')
+  print()
+
+  print('remove a bad point')
+  bad = (0.0, 45.0, 50.0)
+  fit.add(*bad)
+  print(f'with    : R2a {fit.R2a:0.6f}, f(0,45)={fit(0.0, 45.0):0.4f}')
+  fit.remove(*bad)
+  print(f'without : R2a {fit.R2a:0.6f}, f(0,45)={fit(0.0, 45.0):0.4f}, true {polyARI(c, 0.0, 45.0):0.4f}')
+  print()
+
+  print('1D cubic, a window of 20 points sliding along x')
+  cp = [0.24679,2.4678,24.676,246.78]
+  fit = StreamFit(3)
+  xs = [0.5*i for i in range(60)]
+  for i, x in enumerate(xs):
+    fit.add(x, polyh(cp, x))
+    if i >= 20:
+      fit.remove(xs[i-20], polyh(cp, xs[i-20]))
+  w, R2a = polyfit(xs[-20:], [polyh(cp, x) for x in xs[-20:]], 3)
+  print('stream:', [f'{v:0.5f}' for v in fit.coefs], f'R2a {fit.R2a:0.6f}')
+  print('svd   :', [f'{v:0.5f}' for v in w], f'R2a {R2a:0.6f}')
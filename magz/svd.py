@@ -1,15 +1,30 @@
 """
 Singular Valued Decomposition.
   - based on Numerical Recipes 2nd ed.
+  - optional numpy (LAPACK) backend, see set_backend.
 Bruce Wernick
 10 June 2021
 """
 
 from math import sqrt
-from umath import showvec, makemat, makevec, MAX, MIN, SIGN, SQR, pythag
+from collections import OrderedDict
+from hashlib import sha1
+import numpy as np
+from umath import showvec, makevec, MAX, MIN, SIGN, SQR, pythag
 from regress import cod
 
-__all__ = ['SVDsolve', 'polyfit', 'MLRfit', 'poly2Dfit', 'polyARIfit']
+__all__ = ['SVDsolve', 'SVD', 'polyfit', 'MLRfit', 'poly2Dfit', 'polyARIfit',
+  'set_backend', 'design', 'factor', 'clear_cache', 'wlsqfit']
+
+# 'python' (NR svdcmp on lists) or 'numpy' (LAPACK)
+BACKEND = 'python'
+
+def set_backend(name):
+  "select the SVD backend used by SVDsolve, svbksb and the fitters"
+  global BACKEND
+  if name not in ('python', 'numpy'):
+    raise ValueError(f'unknown svd backend {name}!')
+  BACKEND = name
 
 def svdcmp(a, w, v):
   "SVD: Singular Valued Decomposition"
@@ -198,8 +213,19 @@ def svdcmp(a, w, v):
       w[k] = x
     k = k-1
 
-def svbksb(u,w,v,b):
-  "back substitution"
+def svbksb(u,w,v,b,backend=None):
+  """back substitution.
+  b may be a 2D block (m x k) of right hand sides, solved in one
+  matrix product (numpy), the result is then an (n x k) array.
+  """
+  b2d = np.ndim(b) == 2
+  if b2d or (backend or BACKEND) == 'numpy':
+    u, w, v = np.asarray(u, float), np.asarray(w, float), np.asarray(v, float)
+    n = len(w)
+    s = u[:, :n].T @ np.asarray(b, float)
+    wi = np.divide(1.0, w, out=np.zeros(n), where=(w != 0.0))
+    x = v[:n, :n] @ (s * wi[:, None] if b2d else s * wi)
+    return x if b2d else x.tolist()
   m, n = len(u), len(u[0])
   x, tmp = list(range(n)), list(range(n))
   for j in range(0,n):
@@ -216,8 +242,12 @@ def svbksb(u,w,v,b):
       x[j] = s
   return x
 
-def SVDsolve(a,b):
+def SVDsolve(a,b,backend=None):
   "solve set of linear equations by singular valued decomposition"
+  if (backend or BACKEND) == 'numpy':
+    u, w, vt = np.linalg.svd(np.asarray(a, float), full_matrices=False)
+    w[w < w.max()*1.0e-12] = 0.0
+    return svbksb(u, w, vt.T, b, 'numpy')
   m, n = len(a), len(a[0])
   u = [[a[i][j] for j in range(n)] for i in range(m)]
   v = [[0.0 for j in range(n)] for i in range(m)]
@@ -234,6 +264,165 @@ def SVDsolve(a,b):
   x = svbksb(u, w, v, b)
   return x
 
+class SVD(object):
+  """SVD factorization of a, for repeated solves.
+  The decomposition (svdcmp or numpy) is done once and the small
+  singular values are zeroed as in SVDsolve. solve(b) takes a vector,
+  or a 2D block with one right hand side per column.
+  """
+
+  def __init__(self, a, backend=None):
+    self.backend = backend or BACKEND
+    m, n = len(a), len(a[0])
+    if self.backend == 'numpy':
+      u, w, vt = np.linalg.svd(np.asarray(a, float), full_matrices=False)
+      v = vt.T
+    else:
+      u = [[float(a[i][j]) for j in range(n)] for i in range(m)]
+      v = [[0.0 for j in range(n)] for i in range(m)]
+      w = list(range(n))
+      svdcmp(u, w, v)
+    self.u, self.w, self.v = u, np.array(w, float), v
+    self.w[self.w < self.w.max()*1.0e-12] = 0.0
+
+  def solve(self, b):
+    "x for a vector b (list), or X (n x k array) for a block b (m x k)"
+    w = self.w if self.backend == 'numpy' else self.w.tolist()
+    return svbksb(self.u, w, self.v, b, self.backend)
+
+
+# ---------------------------------------------------------------------
+
+# ---------------------------------------------
+# Design matrix of the fitters, built and cached
+# ---------------------------------------------
+
+# column terms as the powers (px, py) of x and y
+TERMS = {
+  'poly2d': ((0,0),(1,0),(2,0),(0,1),(0,2),(1,1),(2,1),(1,2),(2,2)),
+  'ari': ((0,0),(1,0),(0,1),(2,0),(1,1),(0,2),(3,0),(2,1),(1,2),(0,3))}
+
+CACHE_SIZE = 16
+_cache = OrderedDict()
+
+def design(terms, x, y=None):
+  """Design matrix, one row per point and one column per term.
+  terms is an int p (1D polynomial, x**p down to the const as in
+  polyfit), 'poly2d', 'ari', or a list of (px, py) powers and
+  functions f(x, y) of the point arrays.
+  """
+  x = np.asarray(x, float)
+  if isinstance(terms, int):
+    return np.vander(x, terms+1)
+  y = np.asarray(y, float)
+  if isinstance(terms, str):
+    if terms not in TERMS:
+      raise ValueError(f'unknown terms {terms}!')
+    terms = TERMS[terms]
+  cols = []
+  for t in terms:
+    if callable(t):
+      cols.append(np.broadcast_to(np.asarray(t(x, y), float), x.shape))
+    else:
+      px, py = t
+      cols.append(x**px * y**py)
+  return np.column_stack(cols)
+
+def digest(x):
+  "key of a point array"
+  if x is None:
+    return None
+  x = np.ascontiguousarray(x, float)
+  return x.shape, sha1(x.tobytes()).hexdigest()
+
+def factor(terms, x, y=None):
+  """Cached SVD of design(terms, x, y), the matrix is kept as .a
+  The key is the terms, the points and the backend, so repeat fits
+  on the same grid skip both the build and the decomposition.
+  """
+  key = (terms if isinstance(terms, (int, str)) else tuple(terms),
+    BACKEND, digest(x), digest(y))
+  s = _cache.get(key)
+  if s is None:
+    a = design(terms, x, y)
+    s = SVD(a if BACKEND == 'numpy' else a.tolist())
+    s.a = a
+    _cache[key] = s
+    if len(_cache) > CACHE_SIZE:
+      _cache.popitem(last=False)
+  else:
+    _cache.move_to_end(key)
+  return s
+
+def clear_cache():
+  "drop the cached design matrices"
+  _cache.clear()
+
+def lsqfit(terms, z, x, y=None):
+  "coefficients and R2 of a least squares fit on the cached design"
+  s = factor(terms, x, y)
+  z = np.asarray(z, float)
+  w = s.solve(z if s.backend == 'numpy' else z.tolist())
+  zc = s.a @ np.asarray(w)
+  return w, cod(z.tolist(), zc.tolist())
+
+
+# robust weight functions of the scaled residual u, and their tuning c
+def huber(u):
+  "Huber weights"
+  u = np.abs(u)
+  return np.where(u <= 1.0, 1.0, 1.0/np.maximum(u, 1.0))
+
+def tukey(u):
+  "Tukey bisquare weights"
+  return np.where(np.abs(u) < 1.0, (1.0-u*u)**2, 0.0)
+
+ROBUST = {'huber': (huber, 1.345), 'tukey': (tukey, 4.685)}
+
+def wsolve(a, z, wt):
+  "least squares by SVD with the rows scaled by sqrt(wt)"
+  r = np.sqrt(wt)
+  ar, zr = a*r[:, None], z*r
+  if BACKEND == 'numpy':
+    return np.asarray(SVD(ar).solve(zr))
+  return np.asarray(SVD(ar.tolist()).solve(zr.tolist()))
+
+def wlsqfit(terms, z, x, y=None, weights=None, robust=None, c=None,
+  tol=1e-6, maxi=32):
+  """Weighted and robust least squares on the cached design.
+  weights are fixed point weights. robust 'huber' or 'tukey' refits
+  by iteratively reweighted least squares, the residuals are scaled
+  by their median absolute value and c (default 1.345 or 4.685).
+  The design matrix is built once for all the iterations.
+  Returns coefficients, weighted R2, residuals z-zc and the final
+  weights per point (arrays).
+  """
+  s = factor(terms, x, y)
+  a, z = s.a, np.asarray(z, float)
+  w0 = np.ones(len(z)) if weights is None else np.asarray(weights, float)
+  if weights is None:
+    coef = np.asarray(s.solve(z if s.backend == 'numpy' else z.tolist()))
+  else:
+    coef = wsolve(a, z, w0)
+  wt = w0
+  if robust:
+    if robust not in ROBUST:
+      raise ValueError(f'unknown robust weights {robust}!')
+    rho, k = ROBUST[robust]
+    c = c or k
+    for its in range(maxi):
+      res = z - a @ coef
+      sc = np.median(np.abs(res[w0 > 0.0]))/0.6745
+      if sc == 0.0:
+        break
+      wt = w0*rho(res/(c*sc))
+      last, coef = coef, wsolve(a, z, wt)
+      if np.max(np.abs(coef-last)) <= tol*np.max(np.abs(coef)):
+        break
+  res = z - a @ coef
+  zm = (wt @ z)/wt.sum()
+  R2 = 1.0 - (wt @ (res*res))/(wt @ ((z-zm)**2))
+  return coef.tolist(), R2, res, wt
 
 # ---------------------------------------------------------------------
 
@@ -264,17 +453,8 @@ def polyfit(x, y, p):
   if ((n < p+1) or (n != len(y))):
     raise ValueError("Dimension error in polyfit")
 
-  a = makemat(n, p+1, 1.0)
-
-  # set up columns for a polynomial of order p.
-  # actually, MLR with each of the poly terms.
-  for i in range(n):
-    for j in range(p+1):
-      a[i][j] = pow(x[i], 1.0*(p-j))
-
-  w = SVDsolve(a, y)
-  yc = [polyh(w, xi) for xi in x]
-  R2 = cod(y, yc)
+  # MLR with each of the poly terms as a column
+  w, R2 = lsqfit(p, y, x)
   R2a = 1.0-(1.0-R2)*(n-1.0)/(n-p)
   return w, R2a
 
@@ -289,49 +469,28 @@ def poly2d(c,x,y):
   return c[0]+x*(c[1]+x*c[2])+y*(c[3]+y*c[4])+x*y*(c[5]+x*c[6]+y*c[7]+x*y*c[8])
 
 def MLRfit(x, y, z):
-  "poly2d fit"
+  "poly2d fit, z on the grid of x (outer) and y (inner)"
   p = 8
   n = len(z)
-  a = makemat(n, p+1, 0.0)
-  m = len(y)
-  for i in range(len(x)):
-    for j in range(m):
-      k = j + i*m
-      a[k][0] = 1.0              # const
-      a[k][1] = x[i]             # x
-      a[k][2] = x[i]*x[i]        # x2
-      a[k][3] = y[j]             # y
-      a[k][4] = y[j]*y[j]        # y2
-      a[k][5] = x[i]*y[j]        # xy
-      a[k][6] = a[k][2]*y[j]     # x2y
-      a[k][7] = x[i]*a[k][4]     # xy2
-      a[k][8] = a[k][2]*a[k][4]  # x2y2
-  w = SVDsolve(a, z)
-  zc = [poly2d(w,xi,yi) for xi in x for yi in y]
-  R2 = cod(z,zc)
+  X, Y = np.meshgrid(np.asarray(x, float), np.asarray(y, float), indexing='ij')
+  w, R2 = lsqfit('poly2d', z, X.ravel(), Y.ravel())
   R2a = 1.0-(1.0-R2)*(n-1.0)/(n-p)
   return w, R2a
 
-def poly2Dfit(x, y, z):
-  "x, y and z are all the same length"
+def poly2Dfit(x, y, z, weights=None, robust=None, full=False):
+  """x, y and z are all the same length.
+  weights and robust ('huber' or 'tukey') give a weighted or robust
+  fit (see wlsqfit), full=True also returns the residuals and the
+  final weights per point.
+  """
   p = 8
   n = len(z)
-  a = makemat(n, p+1, 0.0)
-  for i in range(n):
-    a[i][0] = 1.0                # const
-    a[i][1] = x[i]               # x
-    a[i][2] = x[i]*x[i]          # x2
-    a[i][3] = y[i]               # y
-    a[i][4] = y[i]*y[i]          # y2
-    a[i][5] = x[i]*y[i]          # xy
-    a[i][6] = a[i][2]*y[i]       # x2y
-    a[i][7] = x[i]*a[i][4]       # xy2
-    a[i][8] = a[i][2]*a[i][4]    # x2y2
-  w = SVDsolve(a, z)
-  zc = [poly2d(w,xi,yi) for xi in x for yi in y]
-  R2 = cod(z,zc)
+  if weights is None and robust is None and not full:
+    w, R2 = lsqfit('poly2d', z, x, y)
+  else:
+    w, R2, res, wt = wlsqfit('poly2d', z, x, y, weights, robust)
   R2a = 1.0-(1.0-R2)*(n-1.0)/(n-p)
-  return w, R2a
+  return (w, R2a, res, wt) if full else (w, R2a)
 
 # ---------------------------------------------------------------------
 
@@ -343,26 +502,20 @@ def poly2Dfit(x, y, z):
 def polyARI(c,x,y):
   return c[0]+x*(x*(x*c[6]+c[3])+c[1])+y*(y*(y*c[9]+c[5])+c[2])+x*y*(c[4]+x*c[7]+y*c[8])
 
-def polyARIfit(x, y, z):
+def polyARIfit(x, y, z, weights=None, robust=None, full=False):
+  """ARI fit, x, y and z are all the same length.
+  weights and robust ('huber' or 'tukey') give a weighted or robust
+  fit (see wlsqfit), full=True also returns the residuals and the
+  final weights per point.
+  """
   p = 9
   n = len(z)
-  a = makemat(n, p+1, 0.0)
-  for i in range(n):
-    a[i][0] = 1.0
-    a[i][1] = x[i]               # x
-    a[i][2] = y[i]               # y
-    a[i][3] = x[i]*x[i]          # x2
-    a[i][4] = x[i]*y[i]          # xy
-    a[i][5] = y[i]*y[i]          # y2
-    a[i][6] = a[i][3]*x[i]       # x3
-    a[i][7] = a[i][3]*y[i]       # x2y
-    a[i][8] = x[i]*a[i][5]       # xy2
-    a[i][9] = a[i][5]*y[i]       # y3
-  w = SVDsolve(a, z)
-  zc = [polyARI(w,xi,yi) for xi in x for yi in y]
-  R2 = cod(z,zc)
+  if weights is None and robust is None and not full:
+    w, R2 = lsqfit('ari', z, x, y)
+  else:
+    w, R2, res, wt = wlsqfit('ari', z, x, y, weights, robust)
   R2a = 1.0-(1.0-R2)*(n-1.0)/(n-p)
-  return w, R2a
+  return (w, R2a, res, wt) if full else (w, R2a)
 
 
 # ---------------------------------------------------------------------
@@ -408,3 +561,53 @@ if __name__ == '__main__':
   print('C:', showvec(c, '%0.5f'))
   print('R2a %0.6f' % (R2a))
   print()
+
+  print('one factorization, several maps on the same grid')
+  te = [float(t) for t in range(-25, 16, 5)]
+  tc = [float(t) for t in range(25, 66, 5)]
+  pts = [(x, y) for x in te for y in tc]
+  a = [[1.0, x, y, x*x, x*y, y*y, x**3, x*x*y, x*y*y, y**3] for x, y in pts]
+  cq = [17.28,0.8397,0.109,0.01513,-0.00703,-0.00566,1.014e-4,-1.563e-4,2.064e-5,3.723e-5]
+  cp = [1.2,0.01,0.03,1e-4,-2e-4,3e-4,1e-6,2e-6,-1e-6,1e-6]
+  cm = [0.05,0.002,-0.0001,1e-5,2e-6,-3e-6,1e-7,1e-7,1e-8,-1e-8]
+  Z = [[polyARI(c, x, y) for c in (cq, cp, cm)] for x, y in pts]
+  s = SVD(a)
+  C = s.solve(Z)
+  for k, c in enumerate((cq, cp, cm)):
+    print('C:', showvec(C[:, k], '%0.4g'), 'err %0.2g' % max(abs(C[:, k]-c)))
+  print()
+
+  print('numpy backend, ARI fit on a dense grid')
+  from time import perf_counter
+  from random import uniform
+  c = [17.28,0.8397,0.109,0.01513,-0.00703,-0.00566,1.014e-4,-1.563e-4,2.064e-5,3.723e-5]
+  x = [uniform(-25.0, 15.0) for i in range(2000)]
+  y = [uniform(25.0, 65.0) for i in range(2000)]
+  z = [polyARI(c, xi, yi) for xi, yi in zip(x, y)]
+  for backend in ('python', 'numpy'):
+    set_backend(backend)
+    t = perf_counter()
+    w = SVDsolve([[1.0, xi, yi, xi*xi, xi*yi, yi*yi, xi**3, xi*xi*yi, xi*yi*yi, yi**3]
+      for xi, yi in zip(x, y)], z)
+    t = perf_counter() - t
+    e = max(abs(wi-ci)/abs(ci) for wi, ci in zip(w, c))
+    print(f'{backend:6s}: {t:0.3f}s, max rel coeff err {e:0.2g}')
+  print()
+
+  print('ARI fits of several maps on one grid, design cached')
+  set_backend('python')
+  t = perf_counter()
+  for c in (cq, cp, cm):
+    z = [polyARI(c, xi, yi) for xi, yi in zip(x, y)]
+    w, R2a = polyARIfit(x, y, z)
+  t = perf_counter() - t
+  print(f'3 fits: {t:0.3f}s, R2a {R2a:0.6f}, cached {len(_cache)}')
+  print()
+
+  print('robust ARI fit, one bad point in the data')
+  z = [polyARI(cq, xi, yi) for xi, yi in zip(x, y)]
+  z[7] += 5.0
+  for robust in (None, 'huber', 'tukey'):
+    w, R2a, res, wt = polyARIfit(x, y, z, robust=robust, full=True)
+    e = max(abs(wi-ci)/abs(ci) for wi, ci in zip(w, cq))
+    print(f'{str(robust):6s}: max rel coeff err {e:0.2g}, weight of bad point {wt[7]:0.3g}')
@@ -6,6 +6,7 @@ Bruce Wernick
 
 import sys
 from math import sqrt, log10
+from collections import OrderedDict
 from const import EPS, TINY
 
 def MIN(a, b):
@@ -30,30 +31,247 @@ def signum(a, b):
 
 # ---------------------------------------------------------------------
 
+class Trace(object):
+
+  """Ring buffer of the last n iterates.
+     Each record is x, f(x), bracket width (None if unknown) and the
+     step type ('bisect', 'iqi', 'secant', 'min' or 'eval'). The lists
+     are allocated once, a record only overwrites a slot.
+  """
+
+  def __init__(self, n=256):
+
+    self.n = n
+    self.x = [0.0] * n
+    self.y = [0.0] * n
+    self.w = [None] * n
+    self.step = [''] * n
+    self.k = 0
+
+
+  def __call__(self, x, y, w=None, step='eval'):
+
+    i = self.k % self.n
+    self.x[i] = x
+    self.y[i] = y
+    self.w[i] = w
+    self.step[i] = step
+    self.k += 1
+
+
+  def __len__(self):
+    return min(self.k, self.n)
+
+
+  def clear(self):
+    self.k = 0
+
+
+  def records(self):
+
+    'list of (i, x, f(x), width, step), oldest first'
+
+    i0 = self.k - len(self)
+    return [(i, self.x[i % self.n], self.y[i % self.n], self.w[i % self.n],
+      self.step[i % self.n]) for i in range(i0, self.k)]
+
+
+  def dump(self):
+
+    'dict of lists, for json'
+
+    r = self.records()
+    keys = ('i', 'x', 'y', 'width', 'step')
+    return {k: [t[j] for t in r] for j, k in enumerate(keys)}
+
+
+  def save(self, path):
+
+    'write the records as csv'
+
+    with open(path, 'w') as f:
+      f.write('i,x,y,width,step\n')
+      for i, x, y, w, step in self.records():
+        f.write(f'{i},{x!r},{y!r},{"" if w is None else repr(w)},{step}\n')
+
+
+class FuncCache(object):
+
+  """Memoizing wrapper for f(x) with call counters.
+     Keeps the last size values (least recently used are dropped).
+     With dx > 0 the lookup key is x rounded to a grid of dx, so points
+     closer than about dx share one evaluation. size=0 only counts.
+     Calls with extra args, f(x, *args), are counted but not cached.
+     With a trace, every real evaluation is recorded.
+     count is f(x) with the counter only, for when neither is needed.
+     The memo is made on the first cached call.
+  """
+
+  def __init__(self, f, size=0, dx=0.0, trace=None):
+
+    self.f = f
+    self.size = size
+    self.dx = dx
+    self.trace = trace
+    self.calls = 0
+    self.hits = 0
+    self.memo = None
+
+
+  def __call__(self, x, *args):
+
+    if self.size <= 0 or args:
+      self.calls += 1
+      if self.trace is None:
+        return self.f(x, *args)
+      y = self.f(x, *args)
+      self.trace(x, y)
+      return y
+
+    k = round(x / self.dx) if self.dx > 0.0 else x
+    memo = self.memo
+    if memo is None:
+      memo = self.memo = OrderedDict()
+    elif k in memo:
+      self.hits += 1
+      memo.move_to_end(k)
+      return memo[k]
+
+    self.calls += 1
+    y = memo[k] = self.f(x)
+    if self.trace is not None:
+      self.trace(x, y)
+    if len(memo) > self.size:
+      memo.popitem(last=False)
+    return y
+
+
+  def count(self, x, *args):
+
+    'f(x), counted only (the lean path with no cache and no trace)'
+
+    self.calls += 1
+    return self.f(x, *args)
+
+
+  def store(self, x, y):
+
+    'put a known value y = f(x) in the cache'
+
+    if self.size > 0:
+      k = round(x / self.dx) if self.dx > 0.0 else x
+      if self.memo is None:
+        self.memo = OrderedDict()
+      self.memo[k] = y
+      self.memo.move_to_end(k)
+      if len(self.memo) > self.size:
+        self.memo.popitem(last=False)
+
+
+  def clear(self):
+
+    'empty the cache and reset the counters'
+
+    self.memo = None
+    self.calls = 0
+    self.hits = 0
+
+
 class RootFind(object):
 
   """Abstract 1D root finder class.
      This is the base class for all root find methods.
+     tol and maxi are class defaults, copied to each instance (or set by
+     the tol and maxi arguments) so that solvers with different limits
+     can run side by side, e.g. in a thread pool. The counters are also
+     per instance, so use one instance per thread.
+     By default f is called bare. With count, cache or a trace it is
+     wrapped in a FuncCache, and calls and hits count the real function
+     evaluations and the cache hits (None when not counted). Set cache
+     to the number of values to keep to stop repeated evaluations of
+     the same x. With xtol the lookup is keyed to a grid of xtol, a hit
+     returns f of a point up to about xtol away, so xtol must be
+     smaller than tol.
+     Derivatives are estimated by finite differences unless they are
+     given, either as functions df(x) and d2f(x) or, with fd=True, by
+     an f that returns (f, df/dx) or (f, df/dx, d2f/dx2) together.
+     Tracing is off by default. Pass a Trace to record the iterates,
+     methods that label their steps (steps = True) record each step,
+     the others record every f evaluation.
   """
 
   # class variables
   tol = 1e-6
   maxi = 128
+  fd = False
+  steps = False
+  count = False
 
-  def __init__(self, f):
+  def __init__(self, f, cache=0, xtol=0.0, tol=None, maxi=None,
+    df=None, d2f=None, fd=None, trace=None, count=None):
 
     'RootFind class constructor'
 
-    self.f = f
+    self.trace = trace
+    self.tol = self.tol if tol is None else tol
+    self.maxi = self.maxi if maxi is None else maxi
+    self.count = self.count if count is None else count
+    if cache > 0 and xtol >= self.tol:
+      raise ValueError('xtol must be smaller than tol!')
+    ftrace = None if self.steps else trace
+    if self.count or cache > 0 or ftrace is not None:
+      self.cache = FuncCache(f, cache, xtol, ftrace)
+    else:
+      self.cache = None
+    # a given df means f returns f(x) only
+    self.fd = (self.fd and df is None) if fd is None else fd
+    self.df = df
+    self.d2f = d2f
+    self.func = f
+    self.feval = self.counted()
+    self.f = self.value if self.fd else self.feval
     self.its = 0
     self.kind = type(self).__name__
 
 
+  def counted(self):
+
+    'bare f, the cache, or only the counter when there is no cache or trace'
+
+    c = self.cache
+    if c is None:
+      return self.func
+    return c.count if c.size <= 0 and c.trace is None else c
+
+
+  @property
+  def calls(self):
+    'number of function evaluations'
+    return None if self.cache is None else self.cache.calls
+
+
+  @property
+  def hits(self):
+    'number of evaluations served from the cache'
+    return None if self.cache is None else self.cache.hits
+
+
+  def value(self, x, *args):
+
+    'f(x) only, when f returns the derivatives too'
+
+    return self.feval(x, *args)[0]
+
+
   def dxdy(self, x):
 
     """f(x) and slope inverse dx/df
     """
 
+    if self.fd or self.df:
+      fo, df = self.dydx(x)
+      return fo, 1.0 / df
+
     e = 1e-2
 
     xo = x
@@ -74,6 +292,13 @@ class RootFind(object):
     """f(x) and slope df/dx
     """
 
+    if self.fd:
+      r = self.feval(x)
+      return r[0], r[1]
+
+    if self.df:
+      return self.f(x), self.df(x)
+
     e = 1e-2
 
     xo = x
@@ -94,6 +319,14 @@ class RootFind(object):
     """f(x), df/dx and d2f/dx2 (2nd derivative)
     """
 
+    if self.fd:
+      r = self.feval(x)
+      if len(r) > 2:
+        return r[0], r[1], r[2]
+
+    elif self.df and self.d2f:
+      return self.f(x), self.df(x), self.d2f(x)
+
     e = 1e-2
 
     h = e * abs(x)
@@ -102,11 +335,107 @@ class RootFind(object):
 
     fo, df = self.dydx(x)
 
-    df2 = (self.f(x+h) - 2.0 * fo + self.f(x-h)) / h / h
+    if self.fd or self.df:
+      # forward difference of the given slope
+      df2 = (self.dydx(x+h)[1] - df) / h
+    else:
+      df2 = (self.f(x+h) - 2.0 * fo + self.f(x-h)) / h / h
 
     return fo, df, df2
 
 
+  def share(self, *xy):
+
+    """keep the bracket end values for the solve that follows.
+       With a cache or counter it holds at least 2 values from here on.
+    """
+
+    if self.fd or self.cache is None:
+      return
+    if self.cache.size < 2:
+      self.cache.size = 2
+      self.f = self.feval = self.cache
+    for x, y in xy:
+      self.cache.store(x, y)
+
+
+  def bracket(self, x1, x2, factor=1.6, maxf=50):
+
+    """Expand [x1, x2] geometrically until f changes sign (NR zbrac).
+       The smaller end (by |f|) is moved outward each step. At most
+       maxf evaluations are used. Returns the bracket (x1, x2).
+    """
+
+    if x1 == x2:
+      raise ValueError('bad initial range in bracket!')
+
+    f1, f2 = self.f(x1), self.f(x2)
+
+    for j in range(maxf-2):
+
+      if f1 * f2 <= 0.0:
+        self.share((x1, f1), (x2, f2))
+        return x1, x2
+
+      if abs(f1) < abs(f2):
+        x1 += factor * (x1 - x2)
+        f1 = self.f(x1)
+      else:
+        x2 += factor * (x2 - x1)
+        f2 = self.f(x2)
+
+    if f1 * f2 <= 0.0:
+      self.share((x1, f1), (x2, f2))
+      return x1, x2
+
+    raise ValueError('no bracket found!')
+
+
+  def brackets(self, x1, x2, n=32, nb=None):
+
+    """Scan [x1, x2] in n segments for sign changes (NR zbrak).
+       Uses n+1 evaluations. Returns a list of (a, fa, b, fb) for up
+       to nb brackets.
+    """
+
+    dx = (x2 - x1) / n
+    x = x1
+    fp = self.f(x)
+    nb = nb or n
+    found = []
+
+    for i in range(1, n+1):
+      xc = x1 + i * dx
+      fc = self.f(xc)
+      if fc * fp <= 0.0:
+        found.append((x, fp, xc, fc))
+        if len(found) >= nb:
+          break
+      x, fp = xc, fc
+
+    return found
+
+
+  def roots(self, x1, x2, n=32, nb=None):
+
+    """All the roots found by scanning [x1, x2] in n segments.
+       Each bracket is solved by this method, reusing the end values.
+    """
+
+    xs = []
+    for a, fa, b, fb in self.brackets(x1, x2, n, nb):
+      if fa == 0.0:
+        x = a
+      elif fb == 0.0:
+        x = b
+      else:
+        self.share((a, fa), (b, fb))
+        x = self(a, b)
+      if not xs or x != xs[-1]:
+        xs.append(x)
+    return xs
+
+
   def __call__(self, *args):
 
     raise NotImplementedError('abstract root finder called!')
@@ -117,15 +446,18 @@ class RootFind(object):
 class Newton(RootFind):
 
   """Newton-Raphson method (pure slope method).
-     Function must return f(x) and slope.
+     Function must return f(x) and slope (or set df, or fd=False for a
+     finite difference slope).
   """
 
+  fd = True
+
   def __call__(self, x):
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       x0 = x
-      y, dydx = self.f(x)
+      y, dydx = self.dydx(x)
 
       if abs(dydx) <= TINY:
         raise ValueError('curve too flat for Newton method!')
@@ -133,15 +465,15 @@ class Newton(RootFind):
       dx = y / dydx
       x -= dx
 
-      if abs(y) <= RootFind.tol:
+      if abs(y) <= self.tol:
         # function value is within tolerance
         return x
 
-      if abs(dx) <= RootFind.tol:
+      if abs(dx) <= self.tol:
         # calculated change in x is small
         return x
 
-      if abs(x-x0) <= RootFind.tol:
+      if abs(x-x0) <= self.tol:
         # x not changing between loops
         return x
 
@@ -164,10 +496,10 @@ class rtSafe(RootFind):
     if fl * fh > 0:
       raise ValueError('Root must be bracketed in rtsafe')
 
-    if abs(fl) <= RootFind.tol:
+    if abs(fl) <= self.tol:
       return x1
 
-    if abs(fh) <= RootFind.tol:
+    if abs(fh) <= self.tol:
       return x2
 
     if fl < 0.0:
@@ -182,7 +514,7 @@ class rtSafe(RootFind):
     dx = dx0
     fx, df = self.dydx(x)
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       if ((((x-xh)*df-fx)*((x-xl)*df-fx) > 0.0) or (abs(2.0*fx) > abs(dx0*df))):
 
@@ -201,10 +533,10 @@ class rtSafe(RootFind):
         t = x
         x -= dx
 
-      if abs(t-x) <= RootFind.tol:
+      if abs(t-x) <= self.tol:
         return x
 
-      if abs(dx) < RootFind.tol:
+      if abs(dx) < self.tol:
         return x
 
       fx, df = self.dydx(x)
@@ -229,11 +561,11 @@ class Secant(RootFind):
       a, b = b, a
       fa, fb = fb, fa
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       dx = fa * (a - b) / (fa - fb)
 
-      if abs(dx) < RootFind.tol * (1 + abs(a)):
+      if abs(dx) < self.tol * (1 + abs(a)):
         return a-dx
 
       b, a = a, a-dx
@@ -262,10 +594,10 @@ class Bisect(RootFind):
       dx = x1 - x2
       x = x2
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       dx *= 0.5
-      if abs(dx) < RootFind.tol:
+      if abs(dx) < self.tol:
         return x
 
       x2 = x + dx
@@ -294,7 +626,7 @@ class Ridder(RootFind):
     xl, xh = x1, x2
     x = -1.11e30
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       xm = 0.5 * (xl + xh)
       fm = self.f(xm)
@@ -308,7 +640,7 @@ class Ridder(RootFind):
       else:
         xnew = xm + (xl - xm) * fm / s
 
-      if (abs(xnew-x) <= RootFind.tol):
+      if (abs(xnew-x) <= self.tol):
         return xnew
 
       x = xnew
@@ -331,7 +663,7 @@ class Ridder(RootFind):
       else:
         raise ValueError('undefined error!')
 
-      if abs(xh-xl) <= RootFind.tol:
+      if abs(xh-xl) <= self.tol:
         return x
 
     raise ValueError('max iterations reached!')
@@ -345,6 +677,8 @@ class Brent(RootFind):
      It is the one recommended by Numerical Recipes.
   """
 
+  steps = True
+
   def __call__(self, a, b):
 
     fa, fb = self.f(a), self.f(b)
@@ -354,7 +688,7 @@ class Brent(RootFind):
 
     c, fc = b, fb
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       if (fb > 0.0 and fc > 0.0) or (fb < 0.0 and fc < 0.0):
         c, fc = a, fa
@@ -364,7 +698,7 @@ class Brent(RootFind):
         a = b; b = c; c = a
         fa = fb; fb = fc; fc = fa
 
-      tol1 = 2.0*EPS*abs(b) + 0.5*RootFind.tol
+      tol1 = 2.0*EPS*abs(b) + 0.5*self.tol
       xm = 0.5*(c-b)
 
       if abs(xm) <= tol1 or fb == 0.0:
@@ -388,18 +722,25 @@ class Brent(RootFind):
         min2 = abs(e * q)
         if (2.0 * p < MIN(min1, min2)):
           e = d; d = p/q
+          step = 'secant' if a == c else 'iqi'
         else:
           d = xm; e = d
+          step = 'bisect'
       else:
         d = xm; e = d
+        step = 'bisect'
       a, fa = b, fb
 
       if abs(d) > tol1:
         b += d
       else:
         b += SIGN(tol1, xm)
+        step = 'min'
       fb = self.f(b)
 
+      if self.trace is not None:
+        self.trace(b, fb, 2.0*abs(xm), step)
+
     raise ValueError('max iterations reached!')
 
 
@@ -426,11 +767,11 @@ class Brent2(RootFind):
 
     x3 = 0.5 * (x1 + x2)
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       f3 = self.f(x3)
 
-      if abs(f3) < RootFind.tol:
+      if abs(f3) < self.tol:
         return x3
 
       if f1 * f3 < 0:
@@ -438,7 +779,7 @@ class Brent2(RootFind):
       else:
         a = x3
 
-      if (x2 - x1) < RootFind.tol * max(abs(x2), 1):
+      if (x2 - x1) < self.tol * max(abs(x2), 1):
         return 0.5 * (x1 + x2)
 
       P = x3*(f1-f2)*(f2-f3+f1) + f2*x1*(f2-f3) + f1*x2*(f3-f1)
@@ -476,6 +817,8 @@ class Wernick(RootFind):
        adjust bracket.
   """
 
+  steps = True
+
   def __call__(self, a, b):
 
     fa = self.f(a)
@@ -488,17 +831,20 @@ class Wernick(RootFind):
 
     assert fa * fb <= 0
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       dx = b - a # bracket delta
       c = a + 0.5 * dx # bisection
 
-      if abs(dx) <= RootFind.tol:
+      if abs(dx) <= self.tol:
         return c
 
       fc = self.f(c)
 
-      if abs(fc) <= RootFind.tol:
+      if self.trace is not None:
+        self.trace(c, fc, abs(dx), 'bisect')
+
+      if abs(fc) <= self.tol:
         return c
 
       if fa != fc and fb != fc:
@@ -506,14 +852,19 @@ class Wernick(RootFind):
         # inv quad interp
         fab, fac, fbc = fa-fb, fa-fc, fb-fc
         s = a*fc*fb/fac/fab + c*fa*fb/fac/fbc - b*fa*fc/fab/fbc
+        step = 'iqi'
 
       else:
 
         # secant
         s = a + dx * fb / (fa - fb)
+        step = 'secant'
 
       fs = self.f(s)
-      if abs(fs) <= RootFind.tol:
+
+      if self.trace is not None:
+        self.trace(s, fs, abs(dx), step)
+      if abs(fs) <= self.tol:
         return s
 
       # adjust bracket [a,c,s,b]
@@ -539,22 +890,28 @@ class Broyden(RootFind):
      inverse is calculated once at the start and simply corrected at each
      step. I'm surprised to not find it everywhere online because it seems
      to be fairly rugged and performs well in everything I throw at it.
+     Pass the slope inverse K from a previous solve to skip the start
+     estimate, the last K is kept in self.K.
   """
 
-  def __call__(self, x):
+  def __call__(self, x, K=None):
 
-    fo, K = self.dxdy(x)
+    if K is None:
+      fo, K = self.dxdy(x)
+    else:
+      fo = self.f(x)
+    self.K = K
 
-    if abs(fo) <= RootFind.tol:
+    if abs(fo) <= self.tol:
       return x
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       dx = -K*fo
       x += dx
       fx = self.f(x)
 
-      if abs(fx) <= RootFind.tol:
+      if abs(fx) <= self.tol:
         return x
 
       dfx = fx - fo
@@ -565,6 +922,7 @@ class Broyden(RootFind):
       a = dx * K * dfx
       dK = -K * (a - dx * dx) / a
       K += dK
+      self.K = K
       fo = fx
 
     raise ValueError('max iterations reached!')
@@ -579,7 +937,7 @@ class Halley(RootFind):
 
   def __call__(self, x):
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       fx, f1, f2 = self.dydx2(x)
       d = 2 * f1 * f1 - fx * f2
@@ -590,7 +948,7 @@ class Halley(RootFind):
       dx = (2 * fx * f1) / d
       x -= dx
 
-      if abs(dx) <= RootFind.tol:
+      if abs(dx) <= self.tol:
         return x
 
     raise ValueError('max iterations reached!')
@@ -603,14 +961,14 @@ class Schroeder(RootFind):
 
   def __call__(self, x):
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       fx, f1, f2 = self.dydx2(x)
       dxn = fx / f1 # newton correction
       dx = dxn * (1.0 + 0.5 * dxn * f2 / f1)
       x -= dx
 
-      if abs(dx) <= RootFind.tol:
+      if abs(dx) <= self.tol:
         return x
 
     raise ValueError('max iterations reached!')
@@ -626,19 +984,19 @@ class Illinois(RootFind):
 
     f1, f2 = self.f(x1), self.f(x2)
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       x3 = x2 - f2 * (x1 - x2) / (f1 - f2)
       f3 = self.f(x3)
 
       if f2 * f3 < 0: # x2 and x3 straddle root
         x1, f1 = x2, f2
-        if abs(f2) <= RootFind.tol:
+        if abs(f2) <= self.tol:
           return x2
       else:
         f1 = 0.5 * f1 # reduce slope
       x2, f2 = x3, f3
-      if abs(f2) <= RootFind.tol:
+      if abs(f2) <= self.tol:
         return x2
 
     raise ValueError('max iterations reached!')
@@ -657,7 +1015,7 @@ class Pegasus(RootFind):
     if f1 * f2 >= 0.0:
       raise ValueError('root must be bracketed!')
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       dx = x2 - x1
       dy = f2 - f1
@@ -669,7 +1027,7 @@ class Pegasus(RootFind):
       f3 = self.f(x3)
       x = x3
 
-      if abs(f3) < RootFind.tol:
+      if abs(f3) < self.tol:
         return x
 
       if f2 * f3 <= 0:
@@ -695,7 +1053,7 @@ class Anderson(RootFind):
     if f1 * f2 >= 0.0:
       raise ValueError('root must be bracketed!')
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
       dx = x2 - x1
       dy = f2 - f1
 
@@ -706,7 +1064,7 @@ class Anderson(RootFind):
       f3 = self.f(x3)
       x = x3
 
-      if abs(f3) < RootFind.tol:
+      if abs(f3) < self.tol:
         return x
 
       if f2 * f3 <= 0:
@@ -736,7 +1094,7 @@ class RegulaFalsi(RootFind):
       raise ValueError('root must be bracketed!')
 
     k = 0
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       df = fa - fb
 
@@ -745,7 +1103,7 @@ class RegulaFalsi(RootFind):
 
       c = (fa * b - fb * a) / df
 
-      if (abs(b-a) < RootFind.tol*abs(b+a)):
+      if (abs(b-a) < self.tol*abs(b+a)):
         return c
 
       fc = self.f(c)
@@ -783,7 +1141,7 @@ class ModRegulaFalsi(RootFind):
     c = a
     fc = fa
 
-    for self.its in range(RootFind.maxi):
+    for self.its in range(self.maxi):
 
       c = (b * fa - a * fb) / (fa - fb)
       fco = fc
@@ -798,7 +1156,7 @@ class ModRegulaFalsi(RootFind):
         if fc * fco > 0.0:
           fa = 0.5 * fa
 
-      if abs(fc) < RootFind.tol:
+      if abs(fc) < self.tol:
         return c
 
     raise ValueError('max iterations reached!')
@@ -808,60 +1166,361 @@ class Trisect(RootFind):
 
   """Divide range into 3 segments.
      Find the range [a,c1], [c1,c2], [c2,b] where the root exists
-     and call it recursively.
+     and repeat on it.
      This is just an experiment to see if I could improve on Bisection.
+     The end values are carried forward, so each step costs one or two
+     new evaluations.
   """
 
-  def __init__(self, f):
-
-    super(Trisect, self).__init__(f)
-    RootFind.its = 0
-
   def __call__(self, a, b):
 
     if a > b:
       a, b = b, a
 
-    d = (b - a) / 3
+    fa = fb = None
+
+    for self.its in range(self.maxi+1):
 
-    if d <= RootFind.tol:
-      return a + d
+      d = (b - a) / 3
+
+      if d <= self.tol:
+        return a + d
+
+      if fa is None:
+        fa = self.f(a)
+      if abs(fa) < self.tol:
+        return a
+
+      if fb is None:
+        fb = self.f(b)
+      if abs(fb) < self.tol:
+        return b
+
+      if fa * fb > 0:
+        raise ValueError("root must be bracketed")
+
+      # 1st tri-step
+      c1 = a + d
+      fc1 = self.f(c1)
+      if fa * fc1 < 0:
+        b, fb = c1, fc1
+        continue
+
+      # 2nd tri-step
+      c2 = b - d
+      fc2 = self.f(c2)
+      if fc1 * fc2 < 0:
+        a, fa = c1, fc1
+        b, fb = c2, fc2
+        continue
+
+      # 3rd tri-step
+      a, fa = c2, fc2
+
+    raise ValueError('maxits reached!')
+
+
+class KSect(RootFind):
+
+  """Divide range into k segments.
+     The k-1 interior points of each step are independent, so they are
+     evaluated together with pool.map when a pool is given (e.g. a
+     concurrent.futures executor). This pays off when f is slow.
+     The end values are carried forward.
+  """
+
+  def __init__(self, f, k=4, pool=None, tol=None, maxi=None, count=None):
+
+    super(KSect, self).__init__(f, tol=tol, maxi=maxi, count=count)
+    if k < 2:
+      raise ValueError('k must be 2 or more!')
+    self.k = k
+    self.pool = pool
+
+
+  def fmap(self, xs):
+
+    'evaluate the interior points, in parallel if there is a pool'
+
+    if self.pool is None:
+      return [self.f(x) for x in xs]
+    if self.cache is not None:
+      self.cache.calls += len(xs)
+    ys = list(self.pool.map(self.func, xs))
+    if self.fd:
+      return [y[0] for y in ys]
+    return ys
+
+
+  def __call__(self, a, b):
+
+    if a > b:
+      a, b = b, a
 
     fa = self.f(a)
-    if abs(fa) < RootFind.tol:
+    if abs(fa) < self.tol:
       return a
 
     fb = self.f(b)
-    if abs(fb) < RootFind.tol:
+    if abs(fb) < self.tol:
       return b
 
     if fa * fb > 0:
-      raise ValueError("root must be bracketed")
+      raise ValueError('root must be bracketed!')
+
+    k = self.k
+
+    for self.its in range(self.maxi):
 
-    self.its += 1
-    if RootFind.its > RootFind.maxi:
-      raise ValueError('maxits reached!')
+      d = (b - a) / k
 
-    # 1st tri-step
-    c1 = a + d
-    fc1 = self.f(c1)
-    if fa * fc1 < 0:
-      return self.__call__(a, c1)
+      if d <= self.tol:
+        return a + 0.5 * (b - a)
 
-    # 2nd tri-step
-    c2 = b - d
-    fc2 = self.f(c2)
-    if fc1 * fc2 < 0:
-      return self.__call__(c1, c2)
+      xs = [a + i * d for i in range(1, k)]
+      ys = self.fmap(xs)
 
-    # 3rd tri-step
-    return self.__call__(c2, b)
+      xs = [a] + xs + [b]
+      ys = [fa] + ys + [fb]
+      for i in range(1, k+1):
+        if abs(ys[i]) < self.tol:
+          return xs[i]
+        if ys[i-1] * ys[i] < 0:
+          a, fa, b, fb = xs[i-1], ys[i-1], xs[i], ys[i]
+          break
+
+    raise ValueError('max iterations reached!')
+
+
+# ---------------------------------------------------------------------
+
+class Continuation(RootFind):
+
+  """Warm-started root solving along a parameter sweep.
+     f(x, p) is solved for each p in turn. Each point starts from the
+     previous root, extrapolated along the sweep (order 0, 1 or 2), and
+     Broyden reuses the last slope inverse K, so there is no slope
+     estimate after the first point. Any single start method can be
+     used (e.g. Newton, where f returns f(x) and slope).
+  """
+
+  def __init__(self, f, order=1, method=None, tol=None, maxi=None,
+    count=None):
+
+    super(Continuation, self).__init__(f, tol=tol, maxi=maxi, count=count)
+    self.order = order
+    self.method = method or Broyden
+    self.reset()
+
+
+  def reset(self):
+
+    'forget the sweep history'
+
+    self.P = []
+    self.X = []
+    self.K = None
+
+
+  def guess(self, p):
+
+    """start value at p by Lagrange extrapolation of the last roots.
+    """
+
+    k = min(self.order + 1, len(self.P))
+    P, X = self.P[-k:], self.X[-k:]
+    x = 0.0
+    for i in range(k):
+      L = 1.0
+      for j in range(k):
+        if j != i:
+          L *= (p - P[j]) / (P[i] - P[j])
+      x += L * X[i]
+    return x
+
+
+  def __call__(self, p, x=None):
+
+    'root of f(x, p), x is only needed for the first point'
+
+    if self.P:
+      x = self.guess(p)
+    elif x is None:
+      raise ValueError('start value needed for the first point!')
+
+    root = self.method(lambda x: self.f(x, p), tol=self.tol, maxi=self.maxi)
+    if self.method is Broyden:
+      x = root(x, self.K)
+      self.K = root.K
+    else:
+      x = root(x)
+    self.its = root.its
+
+    if self.P and p == self.P[-1]:
+      self.X[-1] = x
+    else:
+      self.P.append(p)
+      self.X.append(x)
+      del self.P[:-3], self.X[:-3]
+
+    return x
+
+
+  def sweep(self, ps, x):
+
+    'roots for each p in the sweep, starting at x'
+
+    self.reset()
+    return [self(p, x) for p in ps]
+
+
+# ---------------------------------------------------------------------
+
+class Stalled(Exception):
+  'raised by Hybrid to stop a method that is not converging'
+  pass
+
+
+class Hybrid(RootFind):
+
+  """Auto-selecting root finder.
+     Starts with a fast open method and watches every evaluation. When
+     |f| stops improving (patience calls in a row), the fast method
+     fails, or the root falls outside the given range, it falls back
+     to a safe bracketing method. The bracket is taken from the points
+     already seen where possible, so no evaluations are wasted.
+     used is the name of the method that returned the root.
+     f returns f(x) only, a fast method that expects the slope from f
+     (fd, e.g. Newton) is run with a finite difference slope.
+  """
+
+  def __init__(self, f, fast=None, safe=None, patience=3, fastmax=24,
+    cache=0, xtol=0.0, tol=None, maxi=None, count=None):
+
+    super(Hybrid, self).__init__(f, cache, xtol, tol, maxi, count=count)
+    self.fast = fast or Broyden
+    self.safe = safe or Brent
+    self.patience = patience
+    self.fastmax = fastmax
+    self.used = None
+
+
+  def watch(self, x):
+
+    'evaluate f(x) for the fast method, raise Stalled if no progress'
+
+    y = self.f(x)
+    self.seen.append((x, y))
+    if abs(y) < self.best:
+      self.best = abs(y)
+      self.worse = 0
+    else:
+      self.worse += 1
+    if self.worse >= self.patience or len(self.seen) >= self.fastmax:
+      raise Stalled()
+    return y
+
+
+  def fallback(self, x1, x2):
+
+    'smallest sign change bracket from the seen points'
+
+    pts = sorted(self.seen)
+    best = None
+    for (a, fa), (b, fb) in zip(pts, pts[1:]):
+      if fa * fb <= 0.0 and a != b:
+        if best is None or b - a < best[2] - best[0]:
+          best = (a, fa, b, fb)
+    if best:
+      a, fa, b, fb = best
+      self.share((a, fa), (b, fb))
+      return a, b
+    if x2 is None:
+      pts.sort(key=lambda p: abs(p[1]))
+      x2 = pts[1][0] if len(pts) > 1 and pts[1][0] != x1 else x1 + 1.0
+    return self.bracket(x1, x2)
+
+
+  def __call__(self, x1, x2=None):
+
+    self.seen = []
+    self.best = float('inf')
+    self.worse = 0
+
+    if x2 is None or self.fast in OPEN + (Newton,):
+      start = (x1,) if x2 is None else (0.5 * (x1 + x2),)
+    else:
+      start = (x1, x2)
+
+    kw = dict(fd=False) if getattr(self.fast, 'fd', False) else {}
+    root = self.fast(self.watch, tol=self.tol, maxi=self.maxi, **kw)
+    try:
+      x = root(*start)
+      self.its = root.its
+      if x2 is None or min(x1, x2) <= x <= max(x1, x2):
+        self.used = root.kind
+        return x
+    except (Stalled, ValueError, ZeroDivisionError, OverflowError):
+      self.its = root.its
+
+    a, b = self.fallback(x1, x2)
+    root = self.safe(self.f, tol=self.tol, maxi=self.maxi)
+    x = root(a, b)
+    self.its += root.its
+    self.used = root.kind
+    return x
+
+
+def race(problems, methods=None, tol=None):
+
+  """Run every method on every problem and count the f calls.
+     problems is a list of (f, x1, x2) with [x1, x2] around one root.
+     Open methods start at the middle of the range. A run fails if it
+     raises (any error) or returns a root outside the range.
+     tol overrides the default tolerance of each method.
+     Returns a list of (kind, calls, fails) sorted best first.
+  """
+
+  methods = methods or OPEN + BRACKET
+  table = []
+
+  for method in methods:
+    calls = fails = 0
+    for f, x1, x2 in problems:
+      root = method(f, tol=tol, count=True)
+      try:
+        if method in OPEN:
+          x = root(0.5 * (x1 + x2))
+        else:
+          x = root(x1, x2)
+        if not min(x1, x2) - root.tol <= x <= max(x1, x2) + root.tol:
+          fails += 1
+      except Exception:
+        fails += 1
+      calls += root.calls
+    table.append((method.__name__, calls, fails))
+
+  table.sort(key=lambda t: (t[2], t[1]))
+  return table
+
+
+# single start methods (f returns f(x) only)
+OPEN = (Broyden, Halley, Schroeder)
+
+# bracketing methods
+BRACKET = (rtSafe, Secant, Bisect, Ridder, Brent, Brent2, Wernick,
+  Illinois, Pegasus, Anderson, RegulaFalsi, ModRegulaFalsi, Trisect, KSect)
 
 
 # ---------------------------------------------------------------------
 
 if __name__ == '__main__':
 
+  from concurrent.futures import ThreadPoolExecutor
+
+  # count the f calls of every solver below
+  RootFind.count = True
+
   def func(a,b):
     def f(x):
       y = (x+a)*(x+b)
@@ -872,71 +1531,162 @@ if __name__ == '__main__':
   fx = func(-2, 3)
   root = Newton(fx)
   y = root(7)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   fx = lambda x: (x-2)*(x+3)
 
   root = rtSafe(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Secant(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Bisect(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Ridder(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Brent(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Brent2(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Wernick(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Broyden(fx)
   y = root(7)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Halley(fx)
   y = root(7)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
+
+  # f with analytic derivatives, one call per step
+  fd = lambda x: ((x-2)*(x+3), 2*x+1, 2.0)
+  root = Halley(fd, fd=True)
+  y = root(7)
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Schroeder(fx)
   y = root(7)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
+
+  root = Schroeder(fx, df=lambda x: 2*x+1, d2f=lambda x: 2.0)
+  y = root(7)
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Illinois(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Pegasus(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Anderson(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = RegulaFalsi(fx)
   y = root(15, 0.1)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = ModRegulaFalsi(fx)
   y = root(3, 0.5)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
 
   root = Trisect(fx)
   y = root(3, 0.5)
-  print(f'{root.kind}: root={y:0.7g}, its={root.its}')
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
+
+
+  # warm-started sweep, count the f calls
+  calls = [0]
+  def fxp(x, p):
+    calls[0] += 1
+    return (x-p)*(x+3)
 
+  ps = [2.0 + 0.01*i for i in range(100)]
+  for i in range(3):
+    calls[0] = 0
+    root = Continuation(fxp, order=i)
+    xs = root.sweep(ps, 7.0)
+    print(f'{root.kind}(order={i}): root={xs[-1]:0.7g}, calls={calls[0]}')
+
+  calls[0] = 0
+  for p in ps:
+    y = Broyden(lambda x: fxp(x, p))(7.0)
+  print(f'Broyden (cold): root={y:0.7g}, calls={calls[0]}')
+
+  # cache the repeated evaluations of the 2nd derivative estimate
+  root = Halley(fx, cache=8)
+  y = root(7)
+  print(f'{root.kind}(cache): root={y:0.7g}, its={root.its}, calls={root.calls}, hits={root.hits}')
+
+  root = KSect(fx, k=8)
+  y = root(3, 0.5)
+  print(f'{root.kind}: root={y:0.7g}, its={root.its}, calls={root.calls}')
+
+  # k-section of a slow function on a thread pool
+  from time import sleep, perf_counter
+  def slow(x):
+    sleep(0.002)
+    return (x-2)*(x+3)
+  with ThreadPoolExecutor(7) as pool:
+    for p in (None, pool):
+      root = KSect(slow, k=8, pool=p)
+      t = perf_counter()
+      y = root(3, 0.5)
+      t = perf_counter() - t
+      print(f'{root.kind}(pool={p is not None}): root={y:0.7g}, calls={root.calls}, time={t:0.3f}s')
+
+  # bracket search in front of a bracketing method
+  root = Brent(fx)
+  a, b = root.bracket(5, 6)
+  y = root(a, b)
+  print(f'{root.kind}(bracket {a:0.4g}, {b:0.4g}): root={y:0.7g}, calls={root.calls}, hits={root.hits}')
+
+  # all roots of a multi-root function
+  root = Ridder(lambda x: (x-1)*(x-2)*(x+3))
+  xs = root.roots(-5, 5, 16)
+  print(f'{root.kind}: roots={[round(x, 6) for x in xs]}, calls={root.calls}, hits={root.hits}')
+
+  # hybrid, fast open method with a safe fallback
+  from math import exp, atan
+  root = Hybrid(lambda x: atan(x - 1.0))
+  y = root(-4.0)
+  print(f'{root.kind}({root.used}): root={y:0.7g}, its={root.its}, calls={root.calls}')
+
+  # race all the methods on a few sample problems
+  problems = [
+    (fx, 0.1, 15.0),
+    (lambda x: exp(x) - 10.0, 0.0, 5.0),
+    (lambda x: atan(x - 1.0), -4.0, 7.0),
+    (lambda x: x**3 - 2*x + 2, -3.0, 0.0)]
+  for kind, calls, fails in race(problems):
+    print(f'{kind:16s} calls={calls:4d} fails={fails}')
+
+  # loose screening and tight final solves side by side
+  def solve(tol):
+    root = Brent(fx, tol=tol)
+    return root(15, 0.1), root.its
+  with ThreadPoolExecutor(4) as pool:
+    for tol, (y, its) in zip([1e-2, 1e-12]*2, pool.map(solve, [1e-2, 1e-12]*2)):
+      print(f'Brent(tol={tol:g}): root={y:0.12g}, its={its}')
+
+  # trace the iterates of a solve
+  trace = Trace(16)
+  root = Wernick(lambda x: x**3 - 2*x - 5, trace=trace)
+  y = root(2.0, 3.0)
+  for i, x, y, w, step in trace.records():
+    print(f'{i:3d} {step:6s} x={x:0.10f} f={y:10.3e} width={w:0.3e}')
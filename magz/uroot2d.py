@@ -6,6 +6,7 @@ Bruce Wernick
 """
 
 import sys
+from math import sqrt
 from const import EPS, TINY
 
 class RootFinder(object):
@@ -17,8 +18,8 @@ class RootFinder(object):
     self.f = f
     self.its = 0
 
-  def djac(self, x, y):
-    'jacobian'
+  def djac(self, x, y, fg=None):
+    'jacobian, fg is f(x,y) if already known'
     h = 3.44e-4
     xo, yo = x, y
     dx, dy = h*abs(x), h*abs(y)
@@ -27,7 +28,7 @@ class RootFinder(object):
     if dy == 0.0:
       dy = h
     x += dx; y += dy
-    fxy, gxy = self.f(xo, yo)
+    fxy, gxy = fg or self.f(xo, yo)
     dx, dy = x-xo, y-yo
     fxyo, gxyo = self.f(x, yo)
     fxoy, gxoy = self.f(xo, y)
@@ -84,6 +85,124 @@ class Newton(RootFinder):
         return x,y
     raise ValueError('max iterations reached!')
 
+class DampedNewton(RootFinder):
+
+  """Newton with backtracking line search.
+     The full Newton step is cut back until the merit 0.5*(f^2+g^2)
+     falls enough (Armijo rule, alpha). damped counts the full steps
+     that were cut back, each one an overshoot that plain Newton would
+     have taken (and often failed on).
+  """
+
+  alpha = 1e-4
+
+  def __call__(self, xy):
+    '2D root by damped Newton method'
+    x,y = xy
+    self.its = 0
+    self.damped = 0
+    fg = None
+    for self.its in range(RootFinder.maxi):
+      fxy,gxy,J,G = self.djac(x,y,fg)
+      if abs(G) < EPS:
+        raise ValueError('too flat!')
+      dx = (gxy*J[1] - fxy*J[3])/G
+      dy = (fxy*J[2] - gxy*J[0])/G
+      phi0 = 0.5*(fxy*fxy + gxy*gxy)
+      t = 1.0
+      while True:
+        fg = self.f(x+t*dx, y+t*dy)
+        phi = 0.5*(fg[0]*fg[0] + fg[1]*fg[1])
+        if phi <= (1.0 - 2.0*self.alpha*t)*phi0 or t < 1e-4:
+          break
+        # quadratic backtrack, kept within [0.1t, 0.5t]
+        tq = t*t*phi0 / (phi + (2.0*t - 1.0)*phi0)
+        t = min(max(tq, 0.1*t), 0.5*t)
+      if t < 1.0:
+        self.damped += 1
+      x+=t*dx; y+=t*dy
+      # converged on the full newton step, not the damped one
+      if abs(dx) < RootFinder.tol and abs(dy) < RootFinder.tol:
+        return x,y
+    raise ValueError('max iterations reached!')
+
+class Dogleg(RootFinder):
+
+  """Powell dogleg trust region method.
+     The step is the Newton step when it fits in the trust radius,
+     else the dogleg path between the steepest descent (Cauchy) point
+     and the Newton step. The radius grows or shrinks with the ratio
+     of actual to predicted reduction of 0.5*(f^2+g^2). damped counts
+     the steps that were shortened or rejected. A flat jacobian falls
+     back to steepest descent instead of failing. A step that shrinks
+     to tol is a root only if it was the full newton step or |f| is
+     near zero, else the search is stuck at a minimum of |f|.
+  """
+
+  radius = 1.0
+
+  def __call__(self, xy):
+    '2D root by dogleg trust region method'
+    x,y = xy
+    self.its = 0
+    self.damped = 0
+    delta = self.radius * max(1.0, sqrt(x*x + y*y))
+    fxy,gxy,J,G = self.djac(x,y)
+    for self.its in range(RootFinder.maxi):
+      phi = 0.5*(fxy*fxy + gxy*gxy)
+      # gradient of phi and cauchy step
+      gx = J[0]*fxy + J[2]*gxy
+      gy = J[1]*fxy + J[3]*gxy
+      g2 = gx*gx + gy*gy
+      if g2 == 0.0:
+        if phi == 0.0:
+          return x,y
+        raise ValueError('too flat!')
+      jx, jy = J[0]*gx + J[1]*gy, J[2]*gx + J[3]*gy
+      tau = g2 / (jx*jx + jy*jy)
+      cx, cy = -tau*gx, -tau*gy
+      cn = tau*sqrt(g2)
+      newton = abs(G) >= EPS
+      if newton:
+        nx = (gxy*J[1] - fxy*J[3])/G
+        ny = (fxy*J[2] - gxy*J[0])/G
+        nn = sqrt(nx*nx + ny*ny)
+      full = newton and nn <= delta
+      if full:
+        px, py = nx, ny
+      elif cn >= delta or not newton:
+        px, py = -delta*gx/sqrt(g2), -delta*gy/sqrt(g2)
+      else:
+        # go from the cauchy point toward newton up to the radius
+        ux, uy = nx-cx, ny-cy
+        a = ux*ux + uy*uy
+        b = 2.0*(cx*ux + cy*uy)
+        c = cn*cn - delta*delta
+        s = (-b + sqrt(b*b - 4.0*a*c)) / (2.0*a)
+        px, py = cx + s*ux, cy + s*uy
+      pn = sqrt(px*px + py*py)
+      # predicted and actual reduction
+      rx = fxy + J[0]*px + J[1]*py
+      ry = gxy + J[2]*px + J[3]*py
+      pred = phi - 0.5*(rx*rx + ry*ry)
+      fg = self.f(x+px, y+py)
+      rho = (phi - 0.5*(fg[0]*fg[0] + fg[1]*fg[1])) / pred if pred > 0.0 else -1.0
+      if rho < 0.25:
+        delta = 0.25*pn
+        self.damped += 1
+      elif rho > 0.75 and pn >= 0.99*delta:
+        delta *= 2.0
+      if rho > 1e-4:
+        x += px; y += py
+        if abs(px) < RootFinder.tol and abs(py) < RootFinder.tol:
+          if full or fg[0]*fg[0] + fg[1]*fg[1] <= RootFinder.tol*RootFinder.tol:
+            return x,y
+          raise ValueError('minimum of |f| is not a root!')
+        fxy,gxy,J,G = self.djac(x,y,fg)
+      elif delta < EPS*max(1.0, sqrt(x*x + y*y)):
+        raise ValueError('trust region too small!')
+    raise ValueError('max iterations reached!')
+
 
 # ---------------------------------------------------------------------
 
@@ -95,3 +214,14 @@ if __name__=='__main__':
   x = (1.0,1.0)
   z = root(x)
   print(f'roots = {z}')
+
+  # Newton overshoots on atan, the globalized methods do not
+  from math import atan
+  fxy = lambda x,y:(atan(x-1.0), atan(y-2.0) + 0.1*(x-1.0))
+  for method in (Newton, DampedNewton, Dogleg):
+    root = method(fxy)
+    try:
+      z = root((4.0, 5.0))
+      print(f'{method.__name__}: roots = {z}, its={root.its}, damped={getattr(root, "damped", 0)}')
+    except ValueError as e:
+      print(f'{method.__name__}: {e}')
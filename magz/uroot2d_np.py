@@ -0,0 +1,138 @@
+"""
+Vectorized 2D Root Finder.
+Solve the same 2D system from many start points at once.
+Function f(x,y,*args) must return 2 arrays of errors.
+"""
+
+import numpy as np
+from const import EPS
+from uroot2d import RootFinder
+from np_util import Lanes
+
+__all__ = ['BatchBroyden', 'BatchNewton']
+
+
+class BatchRootFinder(Lanes, RootFinder):
+
+  """Abstract batch 2D root finder.
+     Each lane i starts at (x[i], y[i]), the optional args are per-lane
+     parameter arrays. Converged lanes are dropped from the working
+     set. After a call, its[i] is the iteration count of lane i and
+     ok[i] is False where the lane failed (too flat or max iterations),
+     those roots are nan. The lane bookkeeping (start, retire, result)
+     is np_util.Lanes, as in uroot_np.
+  """
+
+  def __init__(self, f, tol=None, maxi=None):
+    super(BatchRootFinder, self).__init__(f)
+    self.tol = self.tol if tol is None else tol
+    self.maxi = self.maxi if maxi is None else maxi
+    self.ok = None
+
+  def fxy(self, x, y):
+    'evaluate f on the active lanes'
+    f, g = self.f(x, y, *self.args)
+    return np.asarray(f, float), np.asarray(g, float)
+
+  def djac(self, x, y):
+    'jacobian of all the active lanes, as in RootFinder.djac'
+    h = 3.44e-4
+    dx, dy = h*np.abs(x), h*np.abs(y)
+    dx[dx == 0.0] = h
+    dy[dy == 0.0] = h
+    x1, y1 = x + dx, y + dy
+    fxy, gxy = self.fxy(x, y)
+    dx, dy = x1-x, y1-y
+    fxyo, gxyo = self.fxy(x1, y)
+    fxoy, gxoy = self.fxy(x, y1)
+    J = (fxyo-fxy)/dx, (fxoy-fxy)/dy, (gxyo-gxy)/dx, (gxoy-gxy)/dy
+    D = J[0]*J[3] - J[2]*J[1]
+    return fxy, gxy, J, D
+
+
+class BatchBroyden(BatchRootFinder):
+
+  def __call__(self, xy, *args):
+    '2D roots by Broyden method, lane by lane as uroot2d.Broyden'
+    x, y = self.start(xy, args, 2)
+    fxy, gxy, J, D = self.djac(x, y)
+    flat = np.abs(D) < EPS
+    x, y, fxy, gxy, D, *J = self.retire(flat, (x, y), (x, y, fxy, gxy, D) + J,
+      ok=False)
+    B = [J[3]/D, -J[1]/D, -J[2]/D, J[0]/D]
+    dx = -(B[0]*fxy+B[1]*gxy); dy = -(B[2]*fxy+B[3]*gxy)
+    x = x + dx; y = y + dy
+    f0, g0 = fxy, gxy
+    fxy, gxy = self.fxy(x, y)
+    df, dg = fxy-f0, gxy-g0
+    with np.errstate(divide='ignore', invalid='ignore'):
+      for self.it in range(self.maxi):
+        if not self.idx.size:
+          break
+        BdF = B[0]*df+B[1]*dg, B[2]*df+B[3]*dg
+        e = dx*BdF[0] + dy*BdF[1]
+        state = self.retire(np.abs(e) < EPS, (x, y),
+          (x, y, dx, dy, fxy, gxy, e, BdF[0], BdF[1]) + tuple(B))
+        if not self.idx.size:
+          break
+        x, y, dx, dy, fxy, gxy, e, BdF0, BdF1, *B = state
+        u = dx-BdF0, dy-BdF1
+        v = B[0]*dx+B[2]*dy, B[1]*dx+B[3]*dy
+        B = [B[0]+u[0]*v[0]/e, B[1]+u[0]*v[1]/e, B[2]+u[1]*v[0]/e, B[3]+u[1]*v[1]/e]
+        dx = -(B[0]*fxy+B[1]*gxy); dy = -(B[2]*fxy+B[3]*gxy)
+        x = x + dx; y = y + dy
+        done = (np.abs(dx) <= self.tol) & (np.abs(dy) <= self.tol)
+        x, y, dx, dy, fxy, gxy, *B = self.retire(done, (x, y),
+          (x, y, dx, dy, fxy, gxy) + tuple(B))
+        if not self.idx.size:
+          break
+        f0, g0 = fxy, gxy
+        fxy, gxy = self.fxy(x, y)
+        df, dg = fxy-f0, gxy-g0
+    return self.result()
+
+
+class BatchNewton(BatchRootFinder):
+
+  def __call__(self, xy, *args):
+    '2D roots by Newton method, lane by lane as uroot2d.Newton'
+    x, y = self.start(xy, args, 2)
+    for self.it in range(self.maxi):
+      if not self.idx.size:
+        break
+      fxy, gxy, J, G = self.djac(x, y)
+      flat = np.abs(G) < EPS
+      x, y, fxy, gxy, G, *J = self.retire(flat, (x, y), (x, y, fxy, gxy, G) + J,
+        ok=False)
+      dx = (gxy*J[1] - fxy*J[3])/G
+      dy = (fxy*J[2] - gxy*J[0])/G
+      x = x + dx; y = y + dy
+      done = (np.abs(dx) < self.tol) & (np.abs(dy) < self.tol)
+      x, y = self.retire(done, (x, y), (x, y))
+    return self.result()
+
+
+# ---------------------------------------------------------------------
+
+if __name__=='__main__':
+
+  from time import perf_counter
+  from uroot2d import Broyden, Newton
+
+  # circle of radius r meets the line y = x - c
+  fxy = lambda x, y, r, c: (x*x + y*y - r*r, y - x + c)
+  n = 20000
+  r = np.linspace(2.0, 5.0, n)
+  c = np.linspace(0.0, 1.0, n)
+
+  for scalar, batch in ((Broyden, BatchBroyden), (Newton, BatchNewton)):
+    t = perf_counter()
+    for ri, ci in zip(r, c):
+      z = scalar(lambda x, y: fxy(x, y, ri, ci))((1.0, 1.0))
+    t = perf_counter() - t
+    root = batch(fxy)
+    tb = perf_counter()
+    x, y = root((1.0, 1.0), r, c)
+    tb = perf_counter() - tb
+    e = np.max(np.abs(fxy(x, y, r, c)))
+    print(f'{batch.__name__}: loop {t:0.3f}s, batch {tb:0.3f}s, max err={e:0.2g}, max its={root.its.max()}, ok={root.ok.all()}')
@@ -0,0 +1,146 @@
+"""
+1D RootFind benchmark.
+Run every method on a set of hard test functions, record f calls,
+wall time, iterations and failures. Prints a table, writes JSON.
+  python uroot_bench.py [results.json]
+"""
+
+import sys
+import json
+from math import exp, sin, cos, atan, log
+from time import perf_counter
+import uroot
+
+__all__ = ['PROBLEMS', 'METHODS', 'run', 'table', 'save']
+
+
+def step(x):
+  'discontinuous at x=1'
+  return -1.0 if x < 1.0 else 1.0
+
+
+# name, f, a, b, root (None where f changes sign but has no root, the
+# method must report failure)
+PROBLEMS = [
+  ('quadratic', lambda x: (x-2)*(x+3), 0.1, 15.0, 2.0),
+  ('cubic', lambda x: x**3 - 2*x - 5, 2.0, 3.0, 2.0945514815423265),
+  ('triple root', lambda x: (x-1)**3, 0.0, 3.0, 1.0),
+  ('quintic root', lambda x: (x-1)**5, 0.0, 3.0, 1.0),
+  ('flat atan', lambda x: atan(x - 1.0), -4.0, 7.0, 1.0),
+  ('flat x^9', lambda x: x**9 - 1e-9, -1.0, 2.0, 0.1),
+  ('flat exp', lambda x: x*exp(-x*x) - 1e-4, -1.0, 1.0, 1.0000000100000002e-4),
+  ('step', step, 0.0, 3.0, None),
+  ('pole', lambda x: 1.0/(x-1.0), 0.0, 3.0, None),
+  ('steep exp', lambda x: exp(20.0*x) - 1e6, 0.0, 2.0, log(1e6)/20.0),
+  ('kepler', lambda x: x - 0.9*sin(x) - 0.5, 0.0, 3.0, 1.384412720202163),
+  ('cosine', lambda x: cos(x) - x, 0.0, 1.0, 0.7390851332151607),
+  ('wide bracket', lambda x: x - 1e3, -1e6, 1e6, 1e3)]
+
+
+def newton_fd(f, **kw):
+  'Newton with a finite difference slope'
+  return uroot.Newton(f, fd=False, **kw)
+newton_fd.__name__ = 'Newton'
+
+
+METHODS = uroot.OPEN + uroot.BRACKET + (newton_fd, uroot.Hybrid)
+
+
+def run(methods=None, problems=None, repeat=3, tol=None):
+
+  """Solve every problem with every method.
+     Open methods start in the middle of [a, b]. The time is the best
+     of repeat runs. fx is |f| at the returned point. A result is
+     inaccurate when it is further than 1e-3*(1+|root|) from the known
+     root. Where there is no root an error is the right answer (status
+     'no root') and a returned point is a 'false root'.
+     Returns a list of dict records.
+  """
+
+  methods = methods or METHODS
+  problems = problems or PROBLEMS
+  res = []
+
+  for method in methods:
+    kind = method.__name__
+    single = method in uroot.OPEN or method is newton_fd
+    for name, f, a, b, x0 in problems:
+      start = (0.5*(a+b),) if single else (a, b)
+      rec = dict(method=kind, problem=name, root=None, err=None, fx=None,
+        calls=0, its=0, time=None, status='ok')
+      best = None
+      for _ in range(repeat):
+        root = method(f, tol=tol, count=True)
+        t = perf_counter()
+        try:
+          x = root(*start)
+        except Exception as e:
+          rec['status'] = 'no root' if x0 is None else f'{type(e).__name__}: {e}'
+          break
+        t = perf_counter() - t
+        best = t if best is None else min(best, t)
+      rec['calls'] = root.calls
+      rec['its'] = root.its
+      rec['time'] = best
+      if rec['status'] == 'ok':
+        rec['root'] = x
+        try:
+          rec['fx'] = abs(f(x))
+        except ZeroDivisionError:
+          rec['fx'] = float('inf')
+        if x0 is None:
+          rec['status'] = 'false root'
+        else:
+          rec['err'] = abs(x - x0)
+          if rec['err'] > 1e-3*(1.0 + abs(x0)):
+            rec['status'] = 'inaccurate'
+      res.append(rec)
+
+  return res
+
+
+def table(res):
+
+  """Summary by method, best first.
+     fail counts errors, bad counts inaccurate and false roots, calls
+     and time are totals over the problems that passed (a root, or no
+     root reported where there is none).
+  """
+
+  summary = {}
+  for r in res:
+    s = summary.setdefault(r['method'], dict(calls=0, time=0.0, its=0,
+      fail=0, bad=0))
+    if r['status'] in ('ok', 'no root'):
+      s['calls'] += r['calls']
+      s['time'] += r['time'] or 0.0
+      s['its'] += r['its']
+    elif r['status'] in ('inaccurate', 'false root'):
+      s['bad'] += 1
+    else:
+      s['fail'] += 1
+
+  rows = sorted(summary.items(),
+    key=lambda kv: (kv[1]['fail'] + kv[1]['bad'], kv[1]['calls']))
+  lines = [f'{"method":16s} {"calls":>6s} {"its":>5s} {"time ms":>8s} {"fail":>4s} {"bad":>4s}']
+  for kind, s in rows:
+    lines.append(f'{kind:16s} {s["calls"]:6d} {s["its"]:5d} '
+      f'{1e3*s["time"]:8.3f} {s["fail"]:4d} {s["bad"]:4d}')
+  return '\n'.join(lines)
+
+
+def save(res, path):
+  'write the records as JSON'
+  with open(path, 'w') as f:
+    json.dump(res, f, indent=1)
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  res = run()
+  print(table(res))
+  if len(sys.argv) > 1:
+    save(res, sys.argv[1])
+    print(f'saved {len(res)} records to {sys.argv[1]}')
@@ -0,0 +1,293 @@
+"""
+Vectorized 1D RootFind.
+Solve many brackets at once with a vectorized function.
+"""
+
+import numpy as np
+from const import EPS
+from uroot import RootFind
+from np_util import Lanes
+
+__all__ = ['BatchBisect', 'BatchRidder', 'BatchBrent', 'BatchWernick']
+
+# ---------------------------------------------------------------------
+
+class BatchRootFind(Lanes, RootFind):
+
+  """Abstract batch root finder.
+     Each lane i is an independent bracket [a[i], b[i]].
+     The function is called as f(x, *args) with numpy arrays, where the
+     optional args are per-lane parameter arrays. Converged lanes are
+     dropped from the working set, so f only sees the active lanes.
+     After a call, its[i] is the iteration count of lane i and ok[i]
+     is False for lanes that did not converge or were not bracketed
+     (their root is nan). A lane with a root at an end is done at once.
+     The lane bookkeeping (start, retire, result) is np_util.Lanes.
+  """
+
+  def __init__(self, f, tol=None, maxi=None):
+
+    'BatchRootFind class constructor'
+
+    super(BatchRootFind, self).__init__(f, tol=tol, maxi=maxi)
+    self.its = None
+    self.ok = None
+
+
+  def fx(self, x):
+
+    'evaluate f on the active lanes'
+
+    return np.asarray(self.f(x, *self.args), float)
+
+
+  def bracket(self, a, b, fa, fb, *state):
+
+    """retire the lanes with a root at an end, and the lanes that are
+       not bracketed (not ok). returns the compacted (a, b, fa, fb,
+       *state).
+    """
+
+    s = (a, b, fa, fb) + state
+    s = self.retire(s[2] == 0.0, s[0], s)
+    s = self.retire(s[3] == 0.0, s[1], s)
+    return self.retire(s[2] * s[3] > 0.0, s[0], s, ok=False)
+
+
+# ---------------------------------------------------------------------
+
+class BatchBisect(BatchRootFind):
+
+  """Bisection method over arrays of brackets.
+  """
+
+  def __call__(self, x1, x2, *args):
+
+    x1, x2 = self.start((x1, x2), args)
+    f1, f2 = self.fx(x1), self.fx(x2)
+    x1, x2, f1, f2 = self.bracket(x1, x2, f1, f2)
+
+    neg = f1 < 0.0
+    dx = np.where(neg, x2 - x1, x1 - x2)
+    x = np.where(neg, x1, x2)
+
+    for self.it in range(self.maxi):
+
+      if not self.idx.size:
+        break
+
+      dx *= 0.5
+      x, dx = self.retire(np.abs(dx) < self.tol, x, (x, dx))
+      if not self.idx.size:
+        break
+
+      x2 = x + dx
+      f2 = self.fx(x2)
+      x, dx, x2, f2 = self.retire(np.abs(f2) <= EPS, x2, (x, dx, x2, f2))
+
+      x = np.where(f2 <= 0.0, x2, x)
+
+    return self.result()
+
+
+class BatchRidder(BatchRootFind):
+
+  """Ridder's method over arrays of brackets.
+  """
+
+  def __call__(self, x1, x2, *args):
+
+    xl, xh = self.start((x1, x2), args)
+    fl, fh = self.fx(xl), self.fx(xh)
+    xl, xh, fl, fh = self.bracket(xl, xh, fl, fh)
+
+    x = np.full(xl.size, -1.11e30)
+
+    for self.it in range(self.maxi):
+
+      if not self.idx.size:
+        break
+
+      xm = 0.5 * (xl + xh)
+      fm = self.fx(xm)
+
+      s = np.sqrt(fm*fm - fl*fh)
+      state = self.retire(s == 0.0, xm, (xl, xh, fl, fh, x, xm, fm, s))
+      xl, xh, fl, fh, x, xm, fm, s = state
+      if not self.idx.size:
+        break
+
+      xnew = xm + np.where(fl >= fh, xm - xl, xl - xm) * fm / s
+      state = self.retire(np.abs(xnew - x) <= self.tol, xnew,
+        (xl, xh, fl, fh, xm, fm, xnew))
+      xl, xh, fl, fh, xm, fm, x = state
+      if not self.idx.size:
+        break
+
+      fx = self.fx(x)
+      xl, xh, fl, fh, xm, fm, x, fx = self.retire(fx == 0.0, x,
+        (xl, xh, fl, fh, xm, fm, x, fx))
+
+      # SIGN(a, fx) != a, i.e. a and fx straddle the root
+      m1 = np.where(fx >= 0.0, np.abs(fm), -np.abs(fm)) != fm
+      m2 = ~m1 & (np.where(fx >= 0.0, np.abs(fl), -np.abs(fl)) != fl)
+      m3 = ~m1 & ~m2 & (np.where(fx >= 0.0, np.abs(fh), -np.abs(fh)) != fh)
+
+      xl, fl = np.where(m1, xm, xl), np.where(m1, fm, fl)
+      xh, fh = np.where(m1 | m2, x, xh), np.where(m1 | m2, fx, fh)
+      xl, fl = np.where(m3, x, xl), np.where(m3, fx, fl)
+
+      bad = ~(m1 | m2 | m3)
+      xl, xh, fl, fh, x = self.retire(bad, x, (xl, xh, fl, fh, x), ok=False)
+      xl, xh, fl, fh, x = self.retire(np.abs(xh - xl) <= self.tol, x,
+        (xl, xh, fl, fh, x))
+
+    return self.result()
+
+
+class BatchBrent(BatchRootFind):
+
+  """Brent's inverse quadratic method over arrays of brackets.
+     Lane by lane, this follows the same steps as uroot.Brent.
+  """
+
+  def __call__(self, a, b, *args):
+
+    a, b = self.start((a, b), args)
+    fa, fb = self.fx(a), self.fx(b)
+    a, b, fa, fb = self.bracket(a, b, fa, fb)
+
+    c, fc = b.copy(), fb.copy()
+    d = e = b - a
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+      for self.it in range(self.maxi):
+
+        if not self.idx.size:
+          break
+
+        same = ((fb > 0.0) & (fc > 0.0)) | ((fb < 0.0) & (fc < 0.0))
+        c, fc = np.where(same, a, c), np.where(same, fa, fc)
+        d, e = np.where(same, b - a, d), np.where(same, b - a, e)
+
+        swap = np.abs(fc) < np.abs(fb)
+        a, fa = np.where(swap, b, a), np.where(swap, fb, fa)
+        b, c = np.where(swap, c, b), np.where(swap, b, c)
+        fb, fc = np.where(swap, fc, fb), np.where(swap, fb, fc)
+
+        tol1 = 2.0*EPS*np.abs(b) + 0.5*self.tol
+        xm = 0.5*(c-b)
+
+        done = (np.abs(xm) <= tol1) | (fb == 0.0)
+        a, b, c, fa, fb, fc, d, e, tol1, xm = self.retire(done, b,
+          (a, b, c, fa, fb, fc, d, e, tol1, xm))
+        if not self.idx.size:
+          break
+
+        s = fb / fa
+        q1, r = fa / fc, fb / fc
+        p = np.where(a == c, 2.0 * xm * s,
+          s * (2.0 * xm * q1 * (q1-r) - (b-a) * (r-1.0)))
+        q = np.where(a == c, 1.0 - s, (q1-1.0) * (r-1.0) * (s-1.0))
+        q = np.where(p > 0.0, -q, q)
+        p = np.abs(p)
+
+        min1 = 3.0 * xm * q - np.abs(tol1 * q)
+        min2 = np.abs(e * q)
+        interp = (np.abs(e) >= tol1) & (np.abs(fa) > np.abs(fb))
+        accept = interp & (2.0 * p < np.minimum(min1, min2))
+        e = np.where(accept, d, xm)
+        d = np.where(accept, p/q, xm)
+        a, fa = b, fb
+
+        b = b + np.where(np.abs(d) > tol1, d, np.where(xm >= 0.0, tol1, -tol1))
+        fb = self.fx(b)
+
+    return self.result()
+
+
+class BatchWernick(BatchRootFind):
+
+  """Wernick's IQI bracket method over arrays of brackets.
+     Lane by lane, this follows the same steps as uroot.Wernick.
+  """
+
+  def __call__(self, a, b, *args):
+
+    a, b = self.start((a, b), args)
+
+    fa = self.fx(a)
+    a, b, fa = self.retire(np.abs(fa) <= EPS, a, (a, b, fa))
+
+    fb = self.fx(b)
+    a, b, fa, fb = self.retire(np.abs(fb) <= EPS, b, (a, b, fa, fb))
+
+    a, b, fa, fb = self.bracket(a, b, fa, fb)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+      for self.it in range(self.maxi):
+
+        if not self.idx.size:
+          break
+
+        dx = b - a # bracket delta
+        c = a + 0.5 * dx # bisection
+
+        a, b, fa, fb, dx, c = self.retire(np.abs(dx) <= self.tol, c,
+          (a, b, fa, fb, dx, c))
+        if not self.idx.size:
+          break
+
+        fc = self.fx(c)
+        a, b, fa, fb, dx, c, fc = self.retire(np.abs(fc) <= self.tol, c,
+          (a, b, fa, fb, dx, c, fc))
+        if not self.idx.size:
+          break
+
+        # inv quad interp, failing to secant
+        fab, fac, fbc = fa-fb, fa-fc, fb-fc
+        iqi = a*fc*fb/fac/fab + c*fa*fb/fac/fbc - b*fa*fc/fab/fbc
+        sec = a + dx * fb / (fa - fb)
+        s = np.where((fa != fc) & (fb != fc), iqi, sec)
+
+        fs = self.fx(s)
+        a, b, fa, fb, c, fc, s, fs = self.retire(np.abs(fs) <= self.tol, s,
+          (a, b, fa, fb, c, fc, s, fs))
+
+        # adjust bracket [a,c,s,b]
+        m1 = fc * fs < 0
+        m2 = ~m1 & (fa * fc < 0)
+        m3 = ~m1 & ~m2 & (fs * fb < 0)
+        a, fa = np.where(m1, c, a), np.where(m1, fc, fa)
+        b, fb = np.where(m1, s, b), np.where(m1, fs, fb)
+        b, fb = np.where(m2, c, b), np.where(m2, fc, fb)
+        a, fa = np.where(m3, s, a), np.where(m3, fs, fa)
+
+    return self.result()
+
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+  from time import perf_counter
+  from uroot import Brent
+
+  # one equation, many operating points p
+  fx = lambda x, p: (x-p)*(x+3)
+  p = np.linspace(0.5, 12.0, 20000)
+
+  t = perf_counter()
+  y = [Brent(lambda x: fx(x, pi))(15, 0.1) for pi in p]
+  t = perf_counter() - t
+  print(f'Brent (loop): {t:0.3f}s')
+
+  for method in (BatchBisect, BatchRidder, BatchBrent, BatchWernick):
+    root = method(fx)
+    t = perf_counter()
+    x = root(15, 0.1, p)
+    t = perf_counter() - t
+    e = np.max(np.abs(fx(x, p)))
+    print(f'{root.kind}: {t:0.3f}s, max |f|={e:0.3g}, max its={root.its.max()}')
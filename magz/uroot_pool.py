@@ -0,0 +1,122 @@
+"""
+Parallel 1D root sweeps.
+Solve many problems on a process pool, results in shared memory.
+"""
+
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+__all__ = ['sweep']
+
+# result columns
+ROOT, ITS, CALLS, STATUS = range(4)
+
+# status codes
+OK, MAXITS, ERROR = 0, 1, 2
+
+
+def solve_chunk(method, f, kw, name, n, lo, starts, params):
+
+  """Worker, solve problems lo, lo+1, ... into the shared result array.
+     A new solver is made for each problem, f(x, *params[i]) must be
+     a module level function so that it can be sent to the worker.
+     Returns the failures as a list of (index, message).
+  """
+
+  shm = shared_memory.SharedMemory(name=name)
+  try:
+    res = np.ndarray((n, 4), dtype=float, buffer=shm.buf)
+    failed = []
+    for k, (start, p) in enumerate(zip(starts, params)):
+      i = lo + k
+      root = method(lambda x: f(x, *p), **kw)
+      try:
+        res[i, ROOT] = root(*start)
+        res[i, STATUS] = OK
+      except Exception as e:
+        res[i, ROOT] = np.nan
+        msg = str(e)
+        res[i, STATUS] = MAXITS if msg.startswith('max') else ERROR
+        failed.append((i, f'{type(e).__name__}: {msg}'))
+      res[i, ITS] = root.its
+      res[i, CALLS] = root.calls
+    del res
+    return failed
+  finally:
+    shm.close()
+
+
+def sweep(method, f, starts, params=None, workers=None, chunk=None, **kw):
+
+  """Solve f(x, *params[i]) = 0 from starts[i] for every i on a pool.
+     method is a RootFind class (made as method(f, **kw) in the workers),
+     starts[i] is the start value or a tuple of starts (e.g. a bracket).
+     The problems are split into chunks, one task per chunk. Roots,
+     iterations, f calls and a status code go into a shared memory
+     array, only the failures are sent back.
+     Returns roots, its, calls, status arrays and a dict of errors
+     {index: message}. Failed roots are nan (status 1 is max
+     iterations, 2 is any other error).
+  """
+
+  starts = [s if isinstance(s, (tuple, list)) else (s,) for s in starts]
+  kw = dict(kw, count=True)
+  n = len(starts)
+  if params is None:
+    params = [()] * n
+  params = [p if isinstance(p, (tuple, list)) else (p,) for p in params]
+  if len(params) != n:
+    raise ValueError('starts and params must be the same length!')
+
+  workers = workers or os.cpu_count() or 1
+  chunk = chunk or max(1, -(-n // (4 * workers)))
+
+  shm = shared_memory.SharedMemory(create=True, size=max(1, n) * 4 * 8)
+  try:
+    res = np.ndarray((n, 4), dtype=float, buffer=shm.buf)
+    res[:] = np.nan
+    errors = {}
+    with ProcessPoolExecutor(workers) as pool:
+      jobs = [pool.submit(solve_chunk, method, f, kw, shm.name, n, lo,
+        starts[lo:lo+chunk], params[lo:lo+chunk])
+        for lo in range(0, n, chunk)]
+      for job in jobs:
+        errors.update(job.result())
+    out = res.copy()
+    del res
+  finally:
+    shm.close()
+    shm.unlink()
+
+  return (out[:, ROOT], out[:, ITS].astype(int), out[:, CALLS].astype(int),
+    out[:, STATUS].astype(int), errors)
+
+
+# ---------------------------------------------------------------------
+
+def fx(x, p):
+  'demo function, root at x=p'
+  return (x-p)*(x+3)
+
+
+if __name__ == '__main__':
+
+  from time import perf_counter
+  from uroot import Brent
+
+  n = 20000
+  p = list(np.linspace(0.5, 12.0, n))
+  starts = [(0.1, 15.0)] * n
+  starts[7] = (20.0, 30.0) # no root in range
+
+  t = perf_counter()
+  roots, its, calls, status, errors = sweep(Brent, fx, starts, p)
+  t = perf_counter() - t
+  print(f'{n} solves in {t:0.3f}s, failed={len(errors)}, calls={calls.sum()}')
+  for i, msg in errors.items():
+    print(f'  problem {i}: {msg}')
+
+  roots, its, calls, status, errors = sweep(Brent, fx, starts[:8], p[:8], maxi=3)
+  print(f'maxi=3: status={status.tolist()}')
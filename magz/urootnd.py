@@ -0,0 +1,243 @@
+"""
+N-dimensional Root Finder.
+Same interface as uroot2d for any number of unknowns.
+Function f(x) takes an array of N values and returns N errors.
+With a sparsity pattern the jacobian is built by column coloring,
+one f call per group of independent columns, as a sparse matrix.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse.linalg import splu
+from const import EPS
+
+__all__ = ['Broyden', 'Newton', 'colgroups', 'sparse_jac']
+
+
+def colgroups(pattern):
+
+  """Group the columns of a sparsity pattern (greedy coloring).
+     No two columns in a group have a nonzero in the same row, so a
+     group can be perturbed in one f call. Returns a list of column
+     index arrays, the number of groups is the number of f calls.
+  """
+
+  P = sparse.csc_matrix(pattern).astype(bool).astype(np.int32)
+  n = P.shape[1]
+  C = (P.T @ P).tolil()
+  color = np.full(n, -1)
+  for j in np.argsort(-np.diff(P.indptr), kind='stable'):
+    used = set(color[C.rows[j]].tolist())
+    c = 0
+    while c in used:
+      c += 1
+    color[j] = c
+  return [np.nonzero(color == c)[0] for c in range(color.max()+1)]
+
+
+def sparse_jac(f, x, pattern, fx=None, groups=None, h=3.44e-4):
+
+  """Forward difference jacobian of f at x as a csr matrix.
+     Only the nonzeros of pattern are filled, using one f call for
+     each column group (see colgroups).
+  """
+
+  P = sparse.coo_matrix(pattern)
+  r, c = P.row, P.col
+  groups = colgroups(P) if groups is None else groups
+  x = np.array(x, dtype=float)
+  fx = np.asarray(f(x), dtype=float) if fx is None else fx
+
+  dx = h*np.abs(x)
+  dx[dx == 0.0] = h
+  gid = np.empty(len(x), dtype=int)
+  for k, g in enumerate(groups):
+    gid[g] = k
+  vals = np.empty(len(r))
+
+  for k, g in enumerate(groups):
+    xp = x.copy()
+    xp[g] += dx[g]
+    step = xp - x
+    df = np.asarray(f(xp), dtype=float) - fx
+    sel = np.nonzero(gid[c] == k)[0]
+    vals[sel] = df[r[sel]] / step[c[sel]]
+
+  return sparse.csr_matrix((vals, (r, c)), shape=P.shape)
+
+
+class RootFinder(object):
+
+  maxi = 96
+  tol = 1e-6
+
+  def __init__(self, f, tol=None, maxi=None, pattern=None):
+    self.f = f
+    self.tol = self.tol if tol is None else tol
+    self.maxi = self.maxi if maxi is None else maxi
+    self.pattern = None if pattern is None else sparse.csc_matrix(pattern)
+    self.groups = None if pattern is None else colgroups(self.pattern)
+    self.its = 0
+    self.calls = 0
+    self.njac = 0
+
+  def fx(self, x):
+    'f(x) as an array, counted'
+    self.calls += 1
+    return np.asarray(self.f(x), dtype=float)
+
+  def djac(self, x, fx=None):
+    'forward difference jacobian, one f call per unknown (or group)'
+    h = 3.44e-4
+    if fx is None:
+      fx = self.fx(x)
+    if self.pattern is not None:
+      self.njac += 1
+      return fx, sparse_jac(self.fx, x, self.pattern, fx, self.groups, h)
+    n = len(x)
+    J = np.empty((len(fx), n))
+    for j in range(n):
+      dx = h*abs(x[j]) or h
+      xj = x[j]
+      x[j] = xj + dx
+      dx = x[j] - xj
+      J[:, j] = (self.fx(x) - fx) / dx
+      x[j] = xj
+    self.njac += 1
+    return fx, J
+
+
+class Broyden(RootFinder):
+
+  """N-D Broyden method.
+     The inverse jacobian B is made once from a finite difference
+     jacobian and then corrected by the Sherman-Morrison (good Broyden)
+     update, O(N^2) per step with one f call. B is refreshed from a new
+     jacobian only when the update breaks down or |f| stops falling
+     for stall steps.
+  """
+
+  def __init__(self, f, tol=None, maxi=None, stall=3, pattern=None):
+    super(Broyden, self).__init__(f, tol, maxi, pattern)
+    self.stall = stall
+
+  def inverse(self, x, fx):
+    'inverse jacobian at x'
+    fx, J = self.djac(x, fx)
+    if sparse.issparse(J):
+      J = J.toarray()
+    try:
+      return np.linalg.inv(J)
+    except np.linalg.LinAlgError:
+      raise ValueError('too flat!')
+
+  def __call__(self, x):
+    'N-D root by Broyden method'
+    x = np.array(x, dtype=float)
+    self.its = self.calls = self.njac = 0
+    fx = self.fx(x)
+    B = self.inverse(x, fx)
+    worse = 0
+    for self.its in range(self.maxi):
+      dx = -B @ fx
+      x += dx
+      if np.max(np.abs(dx)) <= self.tol:
+        return x
+      f0 = fx
+      fx = self.fx(x)
+      df = fx - f0
+      if np.max(np.abs(fx)) == 0.0:
+        return x
+      worse = worse + 1 if np.linalg.norm(fx) >= np.linalg.norm(f0) else 0
+      Bdf = B @ df
+      e = dx @ Bdf
+      if abs(e) < EPS or worse >= self.stall:
+        B = self.inverse(x, fx)
+        worse = 0
+      else:
+        B += np.outer(dx - Bdf, dx @ B) / e
+    raise ValueError('max iterations reached!')
+
+
+class Newton(RootFinder):
+
+  """N-D Newton method.
+     The LU factors of the jacobian are kept and reused (chord steps)
+     while |f| falls by at least the factor rate per step, so the
+     jacobian is only rebuilt and refactored when convergence slows.
+     rate=0 refactors every step (full Newton). A sparse jacobian is
+     factored by sparse LU (splu).
+  """
+
+  def __init__(self, f, tol=None, maxi=None, rate=0.5, pattern=None):
+    super(Newton, self).__init__(f, tol, maxi, pattern)
+    self.rate = rate
+
+  def factor(self, x, fx):
+    'LU solver of the jacobian at x'
+    fx, J = self.djac(x, fx)
+    if sparse.issparse(J):
+      try:
+        return splu(J.tocsc()).solve
+      except RuntimeError:
+        raise ValueError('too flat!')
+    lu = lu_factor(J, check_finite=False)
+    if np.min(np.abs(np.diag(lu[0]))) < EPS:
+      raise ValueError('too flat!')
+    return lambda b: lu_solve(lu, b, check_finite=False)
+
+  def __call__(self, x):
+    'N-D root by Newton method'
+    x = np.array(x, dtype=float)
+    self.its = self.calls = self.njac = 0
+    fx = self.fx(x)
+    solve = self.factor(x, fx)
+    for self.its in range(self.maxi):
+      dx = -solve(fx)
+      x += dx
+      if np.max(np.abs(dx)) <= self.tol:
+        return x
+      f0 = fx
+      fx = self.fx(x)
+      if np.max(np.abs(fx)) == 0.0:
+        return x
+      if np.linalg.norm(fx) > self.rate * np.linalg.norm(f0):
+        solve = self.factor(x, fx)
+    raise ValueError('max iterations reached!')
+
+
+# ---------------------------------------------------------------------
+
+if __name__=='__main__':
+
+  # Broyden tridiagonal test problem, N unknowns
+  def f(x):
+    y = (3.0 - 2.0*x)*x + 1.0
+    y[1:] -= x[:-1]
+    y[:-1] -= 2.0*x[1:]
+    return y
+
+  for n in (5, 20, 200):
+    x0 = -np.ones(n)
+    for method in (Broyden, Newton):
+      root = method(f)
+      x = root(x0)
+      e = np.max(np.abs(f(x)))
+      print(f'{method.__name__}(N={n}): its={root.its}, calls={root.calls}, jacobians={root.njac}, max err={e:0.2g}')
+
+  # same problem with the tridiagonal sparsity pattern
+  n = 2000
+  pattern = sparse.diags([1.0, 1.0, 1.0], [-1, 0, 1], shape=(n, n))
+  print(f'column groups: {len(colgroups(pattern))} for N={n}')
+  x0 = -np.ones(n)
+  for method in (Broyden, Newton):
+    root = method(f, pattern=pattern)
+    x = root(x0)
+    e = np.max(np.abs(f(x)))
+    print(f'{method.__name__}(N={n}, sparse): its={root.its}, calls={root.calls}, jacobians={root.njac}, max err={e:0.2g}')
+
+  # 2D example from uroot2d
+  fxy = lambda z: (z[0]-2.0, z[1]-7.0)
+  root = Broyden(fxy)
+  print(f'roots = {root((1.0, 1.0))}')